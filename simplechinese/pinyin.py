@@ -17,3 +17,9 @@ def pinyin2str(pinyins):
         return lm.translate_p2c(pinyins.strip().split())
     else:
         return None
+
+def pinyin2str_nbest(pinyins, k=5, beam_width=200, time_budget=None):
+    if lm is not None:
+        return lm.translate_p2c_nbest(pinyins.strip().split(), k, beam_width, time_budget)
+    else:
+        return None
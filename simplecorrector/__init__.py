@@ -1,13 +1,37 @@
+import ast
 import codecs
-import jieba
-import kenlm
 import numpy as np
 import operator
 import os
+import pickle
+import json
+import struct
 import time
-from pypinyin import lazy_pinyin
-
+import weakref
+from bisect import bisect_right
+from collections import ChainMap
+
+try:
+    import kenlm
+except ImportError:
+    kenlm = None
+
+from .lm.scorer import ContextScorer, ngram_avg_scores
+from .pool import CorrectorPool
+from .tokenizer import Tokenizer
+from .utils.ac_automaton import AhoCorasick, OverlayMatcher
+from .utils.cache import cache_path_for, default_cache_dir, dump_cache, file_signature, load_cache
+from .utils.edit_index import EditIndex, FrozenEditIndex
 from .utils.logger import logger
+from .utils.lru import LRUCache
+from .utils.pinyin_table import FrozenPinyinTable, PinyinTable
+from .utils.prefilter import CandidateFilter
+from .utils.registry import registry
+from .utils.spans import ErrorSpans
+from .utils.stats import CorrectorStats, CountingModel, timed
+from .utils.tiers import TierThresholds
+from .utils.snapshot import read_arrays, read_meta, write_arrays
+from .utils.string_table import FrozenDict, StringTable
 from .utils.text_utils import *
 
 
@@ -17,6 +41,14 @@ class ErrorType(object):
     char = 'char'
 
 
+# 派生缓存的格式版本，内容类型名也计入版本键
+WORD_INDEX_VERSION = 2
+PINYIN_TABLE_VERSION = 2
+SNAPSHOT_VERSION = 2
+# 编译快照中直接序列化的小型词典，词典及其索引另存为 mmap 数组
+SNAPSHOT_OBJECTS = ('confusion_dict', 'confusion_matcher', 'same_pinyin_dict', 'same_stroke_dict', 'char_set')
+
+
 class Corrector(object):
 
     def __init__(self, config):
@@ -25,17 +57,248 @@ class Corrector(object):
         self.same_pinyin_path = config.same_pinyin_path
         self.same_stroke_path = config.same_stroke_path
         self.char_set_path = config.char_set_path
-        self.lm_model_path = config.lm_model_path
+        self.lm_model_path = getattr(config, 'lm_model_path', None)
         self.pinyin2word_path = config.pinyin2word_path
+        # 编辑候选的最大替换距离，索引按该距离构建
+        self.edit_distance = getattr(config, 'edit_distance', 1)
+        # 编辑索引、拼音表等派生缓存的目录，默认为用户缓存目录；use_cache=False 时不读写缓存
+        self.cache_dir = None
+        if getattr(config, 'use_cache', True):
+            self.cache_dir = getattr(config, 'cache_dir', None) or default_cache_dir()
+        # 短句纠错结果缓存的内存预算（字节），0 表示不缓存
+        self.block_cache = LRUCache(getattr(config, 'block_cache_bytes', 32 * 1024 * 1024))
+        # 词典编译快照路径，快照有效时直接加载，过期或不存在时解析文本并重新编译
+        self.snapshot_path = getattr(config, 'snapshot_path', None)
+        # 语言模型与词典经进程级注册表在实例间共享，share_models=False 时各自加载
+        self.share_models = getattr(config, 'share_models', True)
+        self._registry_keys = []
+        # 实例未调用 close 就被回收时同样释放共享对象，避免一直驻留在注册表中
+        self._release = weakref.finalize(self, registry.release_all, self._registry_keys)
+        # 运行时加入的混淆词只进入本实例的叠加层
+        self._confusion_overlay = None
+
+        if not self._load_snapshot(self.snapshot_path):
+            self._load_dicts()
+            if self.snapshot_path:
+                self.compile_snapshot(self.snapshot_path)
+        # 分词组件，可注入自定义实现（需提供 segment 方法，见 tokenizer.Tokenizer）
+        self.tokenizer = getattr(config, 'tokenizer', None) or \
+            Tokenizer(cache_bytes=getattr(config, 'tokenizer_cache_bytes', 4 * 1024 * 1024))
+        # 可直接传入已加载的语言模型，任何具有 score/perplexity 接口的对象均可
+        self.lm = getattr(config, 'lm', None) or \
+            self._acquire('lm', [self.lm_model_path], lambda: self._load_lm(self.lm_model_path))
+        # 候选预筛，默认关闭，即全部候选交给语言模型计分
+        self.candidate_filter = None
+        if getattr(config, 'candidate_top_k', None):
+            self.enable_candidate_filter(config.candidate_top_k, getattr(config, 'candidate_filter', 'bigram'))
+        # 各阶段耗时统计，默认关闭
+        self.stats = None
+        if getattr(config, 'enable_stats', False):
+            self.enable_stats(getattr(config, 'stats_log_interval', None))
+        # 分层检测阈值，默认关闭；由 python -m simplecorrector.calibrate 拟合
+        self.tiers = None
+        if getattr(config, 'tier_thresholds_path', None):
+            self.enable_tiered(config.tier_thresholds_path)
+
+    def enable_stats(self, log_interval=None):
+        """
+        开启各阶段耗时、候选集大小与语言模型调用次数统计
+        :param log_interval: 定期输出汇总日志的间隔（秒），None 表示不输出
+        :return: CorrectorStats
+        """
+        if self.stats is None:
+            self.stats = CorrectorStats(log_interval)
+            self.lm = CountingModel(self.lm, self.stats)
+            if self.candidate_filter is not None:
+                self.candidate_filter.lm = self.lm
+        self.stats.log_interval = log_interval
+        return self.stats
+
+    def disable_stats(self):
+        if self.stats is not None:
+            self.lm = self.lm.lm
+            self.stats = None
+            if self.candidate_filter is not None:
+                self.candidate_filter.lm = self.lm
+
+    def get_stats(self):
+        """
+        :return: dict, 各阶段耗时直方图（毫秒）与调用次数、候选集大小、每个短句的语言模型调用次数；未开启时为 None
+        """
+        if self.stats is None:
+            return None
+        result = self.stats.to_dict()
+        if self.tiers is not None:
+            result['tiers'] = self.tiers.counts()
+        return result
+
+    def enable_tiered(self, thresholds):
+        """
+        开启分层检测：先做混淆集与词典检查，再对整个短句计一次语言模型得分，
+        平均每字得分不低于该长度的阈值时跳过字、词 n-gram 检测
+        :param thresholds: TierThresholds 或其 JSON 文件路径
+        :return: TierThresholds
+        """
+        if not isinstance(thresholds, TierThresholds):
+            thresholds = TierThresholds.load(thresholds)
+        self.tiers = thresholds
+        self.clear_cache()
+        return thresholds
+
+    def disable_tiered(self):
+        self.tiers = None
+        self.clear_cache()
 
-        self.confusion_dict = self._load_confusion_dict(self.confusion_path)
-        self.word_dict = self._load_word_dict(self.word_dict_path)
-        self.same_pinyin_dict = self._load_same_pinyin_dict(self.same_pinyin_path)
-        self.same_stroke_dict = self._load_same_stroke_dict(self.same_stroke_path)
-        self.pinyin2word = self._load_pinyin_2_word(self.pinyin2word_path)
-        self.char_set = self._load_char_set(self.char_set_path)
-        self.tokenizer = jieba
-        self.lm = kenlm.Model(self.lm_model_path)
+    def enable_candidate_filter(self, top_k, policy='bigram'):
+        """
+        开启候选预筛：候选先按词频或低阶先验排序，只有前 top_k 个交给语言模型计分
+        :param top_k: 保留的候选数（不含原词）
+        :param policy: 'freq'、'unigram' 或 'bigram'，见 utils.prefilter.CandidateFilter
+        :return: CandidateFilter
+        """
+        self.candidate_filter = CandidateFilter(self.lm, self.word_dict, top_k, policy)
+        self.clear_cache()
+        return self.candidate_filter
+
+    def disable_candidate_filter(self):
+        self.candidate_filter = None
+        self.clear_cache()
+
+    def _acquire(self, kind, paths, loader, extra=()):
+        """
+        经注册表取得共享对象，未开启共享时直接加载
+        :return: 对象，loader 返回 None 时为 None
+        """
+        if not self.share_models:
+            return loader()
+        key, obj = registry.acquire(kind, paths, loader, extra)
+        if key is not None:
+            self._registry_keys.append(key)
+        return obj
+
+    def close(self):
+        """释放共享的模型与词典，之后实例不可再用"""
+        self._release()
+        self.lm = None
+        self.clear_cache()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _load_dicts(self):
+        def load_confusion():
+            confusion = self._load_confusion_dict(self.confusion_path)
+            return confusion, AhoCorasick(confusion)
+
+        self.confusion_dict, self.confusion_matcher = self._acquire('confusion', [self.confusion_path],
+                                                                    load_confusion)
+        self.word_dict = self._acquire('word_dict', [self.word_dict_path],
+                                       lambda: self._load_word_dict(self.word_dict_path))
+        self.same_pinyin_dict = self._acquire('same_pinyin', [self.same_pinyin_path],
+                                              lambda: self._load_same_pinyin_dict(self.same_pinyin_path))
+        self.same_stroke_dict = self._acquire('same_stroke', [self.same_stroke_path],
+                                              lambda: self._load_same_stroke_dict(self.same_stroke_path))
+        self.char_set = self._acquire('char_set', [self.char_set_path],
+                                      lambda: self._load_char_set(self.char_set_path))
+        self.edit_index = self._acquire('edit_index', [self.word_dict_path],
+                                        lambda: self._load_word_index(self.word_dict_path), (self.edit_distance,))
+        self.pinyin_table = self._acquire('pinyin_table', [self.word_dict_path, self.pinyin2word_path],
+                                          lambda: self._load_pinyin_table(self.word_dict_path, self.pinyin2word_path))
+
+    def _snapshot_sources(self):
+        return [self.confusion_path, self.word_dict_path, self.same_pinyin_path, self.same_stroke_path,
+                self.char_set_path, self.pinyin2word_path]
+
+    def _snapshot_meta(self):
+        # 经 JSON 往返后元组会变为列表，统一按列表比较
+        return {'version': SNAPSHOT_VERSION, 'edit_distance': self.edit_distance,
+                'sources': [list(x) for x in file_signature(self._snapshot_sources())]}
+
+    def _load_snapshot(self, path):
+        """
+        读取词典编译快照，词典、编辑索引、拼音表以 mmap 数组方式打开，不做解析
+        :param path: 快照路径
+        :return: bool, 快照存在且与全部源文件一致时为 True
+        """
+        if not path or not os.path.exists(path):
+            return False
+        meta = self._snapshot_meta()
+        objects = self._acquire('snapshot', [path], lambda: self._read_snapshot(path, meta),
+                                (json.dumps(meta, sort_keys=True),))
+        if objects is None:
+            return False
+        for name, obj in objects.items():
+            setattr(self, name, obj)
+        return True
+
+    def _read_snapshot(self, path, meta):
+        """
+        :return: dict, {属性名: 对象}，快照与 meta 不符或文件损坏时返回 None
+        """
+        try:
+            return self._decode_snapshot(path, meta)
+        except (ValueError, KeyError, EOFError, struct.error, pickle.UnpicklingError) as e:
+            # 截断或损坏的快照与过期快照一样，回退到文本源并重新编译
+            logger.warning('snapshot is corrupt, reloading from text sources: %s (%s)' % (path, e))
+            return None
+
+    def _decode_snapshot(self, path, meta):
+        header = read_meta(path)
+        if header is None or header[0] != meta:
+            logger.info('snapshot is stale, reloading from text sources: %s' % path)
+            return None
+        _, arrays = read_arrays(path)
+
+        def sub_arrays(prefix):
+            return dict((k[len(prefix):], v) for k, v in arrays.items() if k.startswith(prefix))
+
+        word_table = StringTable.from_arrays(arrays, 'word_dict.keys.')
+        objects = pickle.loads(arrays['objects'].tobytes())
+        result = dict((name, objects[name]) for name in SNAPSHOT_OBJECTS)
+        result['word_dict'] = FrozenDict(word_table, arrays['word_dict.values'])
+        result['edit_index'] = FrozenEditIndex(word_table, sub_arrays('edit_index.'))
+        result['pinyin_table'] = FrozenPinyinTable(word_table, sub_arrays('pinyin_table.'))
+        return result
+
+    def compile_snapshot(self, path):
+        """
+        把当前全部词典及其索引编译为一个版本化的二进制快照，下次构造时直接 mmap 加载
+        :param path: 快照路径
+        """
+        word_dict = self.word_dict if isinstance(self.word_dict, FrozenDict) else FrozenDict.build(self.word_dict)
+        word_table = word_dict.keys_table
+        arrays = word_table.to_arrays('word_dict.keys.')
+        arrays['word_dict.values'] = word_dict.values
+        for prefix, obj in (('edit_index.', self.edit_index), ('pinyin_table.', self.pinyin_table)):
+            for name, arr in obj.to_arrays(word_table).items():
+                arrays[prefix + name] = arr
+        objects = dict((name, getattr(self, name)) for name in SNAPSHOT_OBJECTS)
+        if self._confusion_overlay is not None:
+            # 快照只对应源文件，运行时加入的混淆词不写入
+            objects['confusion_dict'] = self.confusion_dict.maps[-1]
+            objects['confusion_matcher'] = self.confusion_matcher.base
+        arrays['objects'] = np.frombuffer(pickle.dumps(objects, protocol=pickle.HIGHEST_PROTOCOL), dtype=np.uint8)
+        write_arrays(path, self._snapshot_meta(), arrays)
+        self.snapshot_path = path
+
+    def _load_lm(self, path):
+        """
+        :param path: NLM 模型文件，或 kenlm 的 ARPA/二进制模型
+        :return: 语言模型
+        """
+        from .lm import NLM
+        if NLM.is_model_file(path):
+            return NLM.Model(path)
+        if kenlm is None:
+            raise ImportError('kenlm is not installed, convert the model with '
+                              '"python -m simplecorrector.lm.NLM convert" or pass config.lm: %s' % path)
+        config = kenlm.Config()
+        # 二进制模型以 mmap 方式加载，多个进程共享同一份物理页
+        config.load_method = kenlm.LoadMethod.POPULATE_OR_LAZY
+        return kenlm.Model(path, config)
 
     def _load_confusion_dict(self, path):
         confusion = {}
@@ -56,6 +319,37 @@ class Corrector(object):
         self.confusion_path = path
         return confusion
 
+    def add_confusion(self, variant, origin):
+        """
+        运行时加入混淆词，自动机增量更新
+        :param variant: 变体（错误写法）
+        :param origin: 本体（正确写法）
+        """
+        if self._confusion_overlay is None:
+            # 基础混淆集可能与其他实例共享，新增词放在本实例的叠加层中
+            self._confusion_overlay = {}
+            self.confusion_dict = ChainMap(self._confusion_overlay, self.confusion_dict)
+            self.confusion_matcher = OverlayMatcher(self.confusion_matcher)
+        self._confusion_overlay[variant] = origin
+        self.confusion_matcher.add(variant)
+        self.clear_cache()
+
+    def add_confusion_dict(self, confusion):
+        """
+        批量加入混淆词
+        :param confusion: dict, {变体: 本体}
+        """
+        for variant, origin in confusion.items():
+            self.add_confusion(variant, origin)
+
+    def clear_cache(self):
+        """词典变化后清空短句纠错缓存与分词缓存；直接修改词典属性时需手动调用"""
+        self.block_cache.clear()
+        # 注入的分词组件未必带缓存
+        clear = getattr(self.tokenizer, 'clear', None)
+        if clear is not None:
+            clear()
+
     def _load_word_dict(self, path):
         word_freq = {}
         if not os.path.exists(path):
@@ -121,7 +415,8 @@ class Corrector(object):
             return result
         with codecs.open(path, 'r', encoding='utf-8') as f:
             a = f.read()
-            result = eval(a)
+            # 只接受字面量，不执行文件中的代码
+            result = ast.literal_eval(a)
         return result
 
     def _load_char_set(self, path):
@@ -135,6 +430,36 @@ class Corrector(object):
                     words.add(w)
         return words
 
+    def _load_word_index(self, path):
+        """
+        词典的编辑距离索引，优先从缓存目录读取
+        :param path: 词典路径
+        :return: EditIndex
+        """
+        cache_path = cache_path_for(self.cache_dir, path, '.index.pickle')
+        version = (WORD_INDEX_VERSION, EditIndex.__name__, self.edit_distance)
+        index = load_cache(cache_path, [path], version, EditIndex)
+        if index is None:
+            index = EditIndex(self.word_dict, self.edit_distance)
+            dump_cache(cache_path, [path], version, index)
+        return index
+
+    def _load_pinyin_table(self, word_dict_path, pinyin2word_path):
+        """
+        词典词的拼音键表与 pinyin2word 反向索引，缓存在缓存目录，源文件不变时不再解析 pinyin2word
+        :param word_dict_path: 词典路径
+        :param pinyin2word_path: 拼音-词文件路径
+        :return: PinyinTable
+        """
+        sources = [word_dict_path, pinyin2word_path]
+        cache_path = cache_path_for(self.cache_dir, word_dict_path, '.pinyin.pickle')
+        version = (PINYIN_TABLE_VERSION, PinyinTable.__name__)
+        table = load_cache(cache_path, sources, version, PinyinTable)
+        if table is None:
+            table = PinyinTable(self.word_dict, self._load_pinyin_2_word(pinyin2word_path))
+            dump_cache(cache_path, sources, version, table)
+        return table
+
     def _check_state(self):
         res = True
         res &= self.confusion_dict is not None
@@ -159,25 +484,6 @@ class Corrector(object):
                 return True
         return False
 
-    def _get_max_len(self, d):
-        return max(map(len, [w for w in d]))
-
-    def FMM(self, word_dict, token, window_size=5):
-        idxs = []
-        result = []
-        index = 0
-        text_size = len(token)
-        while text_size > index:
-            for size in range(1,window_size):
-                piece = token[index:index+size]
-                if piece in word_dict:
-                    idxs.append(index)
-                    result.append(piece)
-                    index = index+size
-                    break
-            index = index + 1
-        return idxs, result
-
     def _is_filter_token(self, token):
         # 空
         if not token.strip():
@@ -223,40 +529,35 @@ class Corrector(object):
         result = list(maybe_error_indices[0])
         return result
 
+    @timed('detect_by_confusion')
     def _detect_by_confusion(self, maybe_errors, sentence, start_idx):
         """
         通过混淆词典，检索错误词。
-        :param maybe_errors: 错误词列表
+        :param maybe_errors: 错误词容器 ErrorSpans
         :param sentence: 输入文本
         :param start_idx: 在源文本中的索引
         """
-        # 直接索引-遍历大列表匹配小的 : 每条耗时 0.0002701282501220703 s
-        # stat_time = time.time()
-        # for confuse in self.confusion_dict:
-        #     idx = sentence.find(confuse)
-        #     if idx > -1:
-        #         maybe_err = [confuse, idx + start_idx, idx + len(confuse) + start_idx, ErrorType.confusion]
-        #         if maybe_err not in maybe_errors and not self._check_in_errors(maybe_errors, maybe_err):
-        #             maybe_errors.append(maybe_err)
-        # 前向最大匹配-遍历小的匹配大的：
-        max_len = self._get_max_len(self.confusion_dict.keys())
-        idxs, confuses = self.FMM(self.confusion_dict, sentence, max_len)
-        if len(idxs) > 0:
-            for idx, confuse in zip(idxs, confuses):
-                maybe_err = [confuse, idx + start_idx, idx + len(confuse) + start_idx, ErrorType.confusion]
-                if maybe_err not in maybe_errors and not self._check_in_errors(maybe_errors, maybe_err):
-                    maybe_errors.append(maybe_err)
-        # print('detect_by_confusion 耗时： {}'.format(time.time()-stat_time))
+        # 多模式自动机一次扫描得到全部命中（同起点长词在前），再从左到右取最长且互不重叠的命中，
+        # 避免重叠的混淆词先后替换时互相覆盖。原先的 FMM 在每个位置取最短命中、命中后多跳过一个字，
+        # 且匹配不到长度等于窗口的词，此处的检出结果与之不同
+        last_end = 0
+        for idx, end_idx, confuse in self.confusion_matcher.findall(sentence):
+            if idx < last_end:
+                continue
+            last_end = end_idx
+            maybe_err = [confuse, idx + start_idx, end_idx + start_idx, ErrorType.confusion]
+            maybe_errors.add(maybe_err)
 
+    @timed('detect_by_token')
     def _detect_by_token(self, maybe_errors, sentence, start_idx):
         """
         通过分词后检索是否存在于通用词典。
-        :param maybe_errors: 错误词列表
+        :param maybe_errors: 错误词容器 ErrorSpans
         :param sentence: 输入文本
         :param start_idx: 在源文本中的索引
         """
-        # 切词
-        tokens = self.tokenizer.tokenize(sentence, mode='search')
+        # 切词，搜索模式与 _detect_by_word_ngrm 的精确模式共用一次切分
+        tokens = self.tokenizer.segment(sentence).search
         # 未登录词加入疑似错误词典
         for token, begin_idx, end_idx in tokens:
             # pass filter word
@@ -266,77 +567,49 @@ class Corrector(object):
             if token in self.word_dict:
                 continue
             maybe_err = [token, begin_idx + start_idx, end_idx + start_idx, ErrorType.word]
-            if maybe_err not in maybe_errors and not self._check_in_errors(maybe_errors, maybe_err):
-                maybe_errors.append(maybe_err)
+            maybe_errors.add(maybe_err)
 
+    @timed('detect_by_word_ngrm')
     def _detect_by_word_ngrm(self, maybe_errors, sentence, start_idx):
         try:
-            ngram_avg_scores = []
-            tokens = [x for x in self.tokenizer.cut(sentence)]
-            for n in [1, 2, 3]:
-                scores = []
-                for i in range(len(tokens) - n + 1):
-                    word = tokens[i:i + n]
-                    score = self.lm.score(' '.join(list(word)), bos=False, eos=False)
-                    scores.append(score)
-                if not scores:
-                    continue
-                # 移动窗口补全得分
-                for _ in range(n - 1):
-                    scores.insert(0, scores[0])
-                    scores.append(scores[-1])
-                    # scores.append(sum(scores)/len(scores))
-                avg_scores = [sum(scores[i:i + n]) / len(scores[i:i + n]) for i in range(len(tokens))]
-                ngram_avg_scores.append(avg_scores)
-
-            if ngram_avg_scores:
+            spans = self.tokenizer.segment(sentence).precise
+            tokens = [token for token, _, _ in spans]
+            # 一次遍历取得 1-3 阶得分并滑动平均
+            ngram_scores = ngram_avg_scores(self.lm, tokens, [1, 2, 3])
+
+            if len(ngram_scores):
                 # 取拼接后的n-gram平均得分
-                sent_scores = list(np.average(np.array(ngram_avg_scores), axis=0))
+                sent_scores = np.average(ngram_scores, axis=0)
                 # 取疑似错字信息
                 for i in self._get_maybe_error_index(sent_scores, threshold=1):
-                    token = tokens[i]
-                    i = sentence.find(token)
+                    # 取分词给出的实际位置，重复出现的词不再都定位到第一次出现处
+                    token, i, _ = spans[i]
                     if len(token) == 1:
                         type = ErrorType.char
                     else:
                         type = ErrorType.word
                     maybe_err = [token, i+start_idx, i+len(token)+start_idx, type]
-                    if maybe_err not in maybe_errors and not self._check_in_errors(maybe_errors, maybe_err):
-                        maybe_errors.append(maybe_err)
+                    maybe_errors.add(maybe_err)
 
         except IndexError as ie:
             logger.warn("index error, sentence:" + sentence + str(ie))
         except Exception as e:
             logger.warn("detect error, sentence:" + sentence + str(e))
 
+    @timed('detect_by_char_ngrm')
     def _detect_by_char_ngrm(self, maybe_errors, sentence, start_idx):
         try:
-            ngram_avg_scores = []
-            for n in [1, 2, 3, 4]:
-                scores = []
-                for i in range(len(sentence) - n + 1):
-                    word = sentence[i:i + n]
-                    score = self.lm.score(' '.join(list(word)), bos=False, eos=False)
-                    scores.append(score)
-                if not scores:
-                    continue
-                # 移动窗口补全得分
-                for _ in range(n - 1):
-                    scores.insert(0, scores[0])
-                    scores.append(scores[-1])
-                    # scores.append(sum(scores) / len(scores))
-                avg_scores = [sum(scores[i:i + n]) / len(scores[i:i + n]) for i in range(len(sentence))]
-                ngram_avg_scores.append(avg_scores)
-
-            if ngram_avg_scores:
+            # 一次遍历取得 1-4 阶得分并滑动平均
+            ngram_scores = ngram_avg_scores(self.lm, list(sentence), [1, 2, 3, 4])
+
+            if len(ngram_scores):
                 # 取拼接后的n-gram平均得分
-                sent_scores = list(np.average(np.array(ngram_avg_scores), axis=0))
+                sent_scores = np.average(ngram_scores, axis=0)
                 # 取疑似错字信息
                 for i in self._get_maybe_error_index(sent_scores):
                     token = sentence[i]
                     maybe_err = [token, i+start_idx, i+len(token)+start_idx, ErrorType.char]
-                    if maybe_err not in maybe_errors and not self._check_in_errors(maybe_errors, maybe_err):
-                        maybe_errors.append(maybe_err)
+                    maybe_errors.add(maybe_err)
 
         except IndexError as ie:
             logger.warn("index error, sentence:" + sentence + str(ie))
@@ -344,26 +617,54 @@ class Corrector(object):
             logger.warn("detect error, sentence:" + sentence + str(e))
 
     def _detect_short(self, sentence, start_idx, is_confusion, is_token, is_wordgram, is_ngram):
-        maybe_errors = []
+        # 有序区间容器，去重与包含判断均为 O(log n)，遍历即按起点排序
+        maybe_errors = ErrorSpans()
         if not sentence.strip():
             return maybe_errors
         if is_confusion:
             self._detect_by_confusion(maybe_errors, sentence, start_idx)
         if is_token:
             self._detect_by_token(maybe_errors, sentence, start_idx)
+        if (is_wordgram or is_ngram) and self.tiers is not None:
+            # 整句得分不低于该长度的阈值时视为干净，跳过 n-gram 检测
+            if self.tiers.is_clean(*self.block_score(sentence)):
+                return maybe_errors
         if is_wordgram:
             self._detect_by_word_ngrm(maybe_errors, sentence, start_idx)
         if is_ngram:
             self._detect_by_char_ngrm(maybe_errors, sentence, start_idx)
-        return sorted(maybe_errors, key=lambda x: x[1], reverse=False)
+        return maybe_errors
+
+    @timed('block_score')
+    def block_score(self, sentence):
+        """
+        短句整句的字级语言模型得分
+        :param sentence: 短句
+        :return: (字数, 含句尾在内的平均每字 log10 概率)，空白短句为 (0, None)
+        """
+        chars = [c for c in sentence if not c.isspace()]
+        if not chars:
+            return 0, None
+        return len(chars), self.lm.score(' '.join(chars), bos=True, eos=True) / (len(chars) + 1)
 
+    @timed('candidates')
     def _candidates(self, word, fregment=1):
         candidates = []
         if len(word) > 1:
             candidates += self._candidates_by_edit(word)
         candidates += self._candidates_by_pinyin(word)
         candidates += self._candidates_by_stroke(word)
-        return set(candidates)
+        candidates = set(candidates)
+        if self.stats is not None:
+            self.stats.candidates.observe(len(candidates))
+        return candidates
+
+    @timed('prefilter')
+    def _prefilter_candidates(self, cur_item, candidates, before_sent, after_sent):
+        candidates, pruned = self.candidate_filter.select(cur_item, candidates, before_sent, after_sent)
+        if self.stats is not None:
+            self.stats.pruned.observe(pruned)
+        return candidates
 
     def known(self, words):
         """The subset of `words` that appear in the dictionary of WORDS."""
@@ -377,11 +678,14 @@ class Corrector(object):
         return set(transposes + replaces)
 
     def _candidates_by_edit(self, word):
-        return [w for w in self.known(self.edits1(word)) or [word] if lazy_pinyin(word) == lazy_pinyin(w)]
+        # 查删除邻域索引代替 known(edits1(word))，拼音比较查预先算好的键
+        key = self.pinyin_table.key(word)
+        known = self.edit_index.lookup(word, self.edit_distance, self.char_set)
+        return [w for w in known or [word] if self.pinyin_table.key(w) == key]
 
     def _candidates_by_pinyin(self, word):
         l = []
-        r = list(self.pinyin2word.get(','.join(lazy_pinyin(word)), {word:''}).keys())
+        r = list(self.pinyin_table.words(self.pinyin_table.key(word), (word,)))
         for i, w in enumerate(word):
             before = word[:i]
             after = word[i+1:]
@@ -401,6 +705,11 @@ class Corrector(object):
         return set(l)
 
     def _calibration(self, maybe_errors):
+        """
+        合并相邻的单字错误
+        :param maybe_errors: 按起点有序的 ErrorSpans，顺序遍历一次即可
+        :return: list
+        """
         res = []
         pre_item = None
         for cur_item, begin_idx, end_idx, err_type in maybe_errors:
@@ -417,7 +726,8 @@ class Corrector(object):
             res.append(pre_item)
         return res
 
-    def get_lm_correct_item(self, cur_item, candidates, before_sent, after_sent, threshold=57):
+    @timed('get_lm_correct_item')
+    def get_lm_correct_item(self, cur_item, candidates, before_sent, after_sent, threshold=57, context_window=True):
         """
         通过语言模型纠正字词错误
         :param cur_item: 当前词
@@ -425,11 +735,15 @@ class Corrector(object):
         :param before_sent: 前半部分句子
         :param after_sent: 后半部分句子
         :param threshold: ppl阈值, 原始字词替换后大于ppl则是错误
+        :param context_window: 只对替换片段附近的 n-gram 窗口计分并剪枝，结果与整句计分相同
         :return: str, correct item, 正确的字词
         """
         result = cur_item
+        candidates = list(candidates)
         if cur_item not in candidates:
             candidates.append(cur_item)
+        if context_window and hasattr(self.lm, 'BaseScore'):
+            return self._get_lm_correct_item_in_window(cur_item, candidates, before_sent, after_sent, threshold)
         ppl_scores = {i: self.lm.perplexity(' '.join(list(before_sent + i + after_sent))) for i in candidates}
         sorted_ppl_scores = sorted(ppl_scores.items(), key=lambda d: d[1])
         # 增加正确字词的修正范围，减少误纠
@@ -450,6 +764,30 @@ class Corrector(object):
             result = top_items[0]
         return result
 
+    def _get_lm_correct_item_in_window(self, cur_item, candidates, before_sent, after_sent, threshold):
+        """
+        上下文窗口计分：只有困惑度比原词低 threshold 以上的最优候选才会替换原词，
+        因此候选的困惑度下界一旦超过当前最优值或 原词困惑度-threshold，即可停止计分。
+        """
+        scorer = ContextScorer(self.lm, before_sent, after_sent)
+        cur_score = scorer.perplexity(cur_item)
+        limit = cur_score - threshold
+        best_item, best_score = None, None
+        for item in candidates:
+            if item == cur_item:
+                score = cur_score
+            else:
+                bound = limit if best_score is None else min(limit, best_score)
+                score = scorer.perplexity(item, bound=bound)
+                if score is None:
+                    continue
+            # 同分时保留靠前的候选，与整句排序一致
+            if best_score is None or score < best_score:
+                best_item, best_score = item, score
+        if best_item is not None and cur_score >= best_score + threshold:
+            return best_item
+        return cur_item
+
     def correct(self, text, is_confusion=True, is_token=True, is_wordgram=True, is_ngram=True):
         if text is None or not text.strip():
             # logger.warn("Input text is error.")
@@ -463,27 +801,190 @@ class Corrector(object):
         details = []
         text = self._process_text(text)
         blocks = split_long_text(text, include_symbol=True)
+        flags = (is_confusion, is_token, is_wordgram, is_ngram)
         for blk, idx in blocks:
-            maybe_errors = self._detect_short(blk, idx, is_confusion, is_token, is_wordgram, is_ngram)
-            maybe_errors = self._calibration(maybe_errors)
-            for cur_item, begin_idx, end_idx, err_type in maybe_errors:
-                # 纠错，逐个处理
-                before_sent = blk[:(begin_idx - idx)]
-                after_sent = blk[(end_idx - idx):]
-
-                # 困惑集中指定的词，直接取结果
-                if err_type == ErrorType.confusion:
-                    corrected_item = self.confusion_dict[cur_item]
-                else:
-                    # 取得所有可能正确的词
-                    candidates = self._candidates(cur_item)
-                    if not candidates:
-                        continue
-                    corrected_item = self.get_lm_correct_item(cur_item, candidates, before_sent, after_sent)
-                if corrected_item != cur_item:
-                    blk = before_sent + corrected_item + after_sent
-                    detail_word = [cur_item, corrected_item, begin_idx, end_idx]
-                    details.append(detail_word)
-            text_new += blk
+            blk_new, blk_details = self._correct_block_cached(blk, flags)
+            # 缓存中的位置相对短句起点，换算回原文位置
+            for cur_item, corrected_item, begin_idx, end_idx in blk_details:
+                details.append([cur_item, corrected_item, begin_idx + idx, end_idx + idx])
+            text_new += blk_new
+        details = sorted(details, key=operator.itemgetter(2))
+        if self.stats is not None:
+            self.stats.maybe_log()
+        return text_new, details
+
+    def correct_incremental(self, prev_text, prev_result, new_text, is_confusion=True, is_token=True,
+                            is_wordgram=True, is_ngram=True):
+        """
+        增量纠错：只重新纠正与上次相比发生变化的短句，首尾未变的短句复用上次的结果并平移位置，
+        耗时与改动范围而非全文长度成正比。检测开关须与上次调用相同
+        :param prev_text: 上次输入的文本
+        :param prev_result: 上次 correct / correct_incremental 的返回值 (corrected_text, details)
+        :param new_text: 新文本
+        :return: (corrected_text, details)，与 correct(new_text) 相同
+        """
+        flags = (is_confusion, is_token, is_wordgram, is_ngram)
+        if prev_text is None or prev_result is None or new_text is None or not new_text.strip() \
+                or not self._check_state():
+            return self.correct(new_text, *flags)
+        text = self._process_text(new_text)
+        old_blocks = split_long_text(self._process_text(prev_text), include_symbol=True)
+        new_blocks = split_long_text(text, include_symbol=True)
+        old = self._split_result(old_blocks, prev_result)
+        if old is None:
+            logger.warning('previous result does not match previous text, correcting the whole text')
+            return self.correct(new_text, *flags)
+
+        # 首尾相同的短句数
+        n_old, n_new = len(old_blocks), len(new_blocks)
+        prefix = 0
+        while prefix < min(n_old, n_new) and old_blocks[prefix][0] == new_blocks[prefix][0]:
+            prefix += 1
+        suffix = 0
+        while suffix < min(n_old, n_new) - prefix and \
+                old_blocks[n_old - 1 - suffix][0] == new_blocks[n_new - 1 - suffix][0]:
+            suffix += 1
+
+        text_new = ''
+        details = []
+        for k, (blk, idx) in enumerate(new_blocks):
+            if k < prefix:
+                reused = old[k]
+            elif k >= n_new - suffix:
+                reused = old[k - n_new + n_old]
+            else:
+                reused = None
+            if reused is not None:
+                blk_new, blk_details = reused
+            else:
+                blk_new, blk_details = self._correct_block_cached(blk, flags)
+            for cur_item, corrected_item, begin_idx, end_idx in blk_details:
+                details.append([cur_item, corrected_item, begin_idx + idx, end_idx + idx])
+            text_new += blk_new
         details = sorted(details, key=operator.itemgetter(2))
-        return text_new, details
\ No newline at end of file
+        if self.stats is not None:
+            self.stats.maybe_log()
+        return text_new, details
+
+    def _split_result(self, blocks, result):
+        """
+        把整篇纠错结果按短句拆开
+        :param blocks: split_long_text 的结果
+        :param result: (corrected_text, details)
+        :return: list of (纠正后的短句, 相对短句起点的 details)，与 blocks 不符时返回 None
+        """
+        text_new, details = result
+        starts = [idx for _, idx in blocks]
+        block_details = [[] for _ in blocks]
+        deltas = [0] * len(blocks)
+        # details 的位置是原文位置，不受之前改变长度的纠正影响，按起点即可归入短句；
+        # 纠正后的短句长度为原长加上句内各处纠正的长度变化
+        for cur_item, corrected_item, begin_idx, end_idx in details:
+            k = bisect_right(starts, begin_idx) - 1
+            if k < 0:
+                return None
+            block_details[k].append((cur_item, corrected_item, begin_idx - starts[k], end_idx - starts[k]))
+            deltas[k] += len(corrected_item) - len(cur_item)
+        result = []
+        pos = 0
+        for k, (blk, _) in enumerate(blocks):
+            size = len(blk) + deltas[k]
+            result.append((text_new[pos:pos + size], tuple(block_details[k])))
+            pos += size
+        if pos != len(text_new):
+            return None
+        return result
+
+    def _correct_block_cached(self, blk, flags):
+        if not self.block_cache.max_bytes:
+            return self._correct_block(blk, *flags)
+        key = (blk, flags)
+        result = self.block_cache.get(key)
+        if result is None:
+            result = self._correct_block(blk, *flags)
+            self.block_cache.put(key, result)
+        return result
+
+    def _correct_block(self, blk, is_confusion, is_token, is_wordgram, is_ngram):
+        """
+        纠正单个短句，位置均相对短句起点
+        :return: (corrected_block, details)
+        """
+        details = []
+        stats = self.stats
+        if stats is not None:
+            lm_calls = stats.lm_calls
+        maybe_errors = self._detect_short(blk, 0, is_confusion, is_token, is_wordgram, is_ngram)
+        maybe_errors = self._calibration(maybe_errors)
+        # shift: 已做替换造成的长度变化；applied_end: 已替换片段在原文中的最远终点
+        shift = 0
+        applied_end = 0
+        for cur_item, begin_idx, end_idx, err_type in maybe_errors:
+            # 纠错，逐个处理；与已替换片段重叠的疑似错误，原文已被改写，跳过
+            if begin_idx < applied_end:
+                continue
+            before_sent = blk[:begin_idx + shift]
+            after_sent = blk[end_idx + shift:]
+
+            # 困惑集中指定的词，直接取结果
+            if err_type == ErrorType.confusion:
+                corrected_item = self.confusion_dict[cur_item]
+            else:
+                # 取得所有可能正确的词
+                candidates = self._candidates(cur_item)
+                if not candidates:
+                    continue
+                if self.candidate_filter is not None:
+                    candidates = self._prefilter_candidates(cur_item, candidates, before_sent, after_sent)
+                corrected_item = self.get_lm_correct_item(cur_item, candidates, before_sent, after_sent)
+            if corrected_item != cur_item:
+                blk = before_sent + corrected_item + after_sent
+                detail_word = (cur_item, corrected_item, begin_idx, end_idx)
+                details.append(detail_word)
+                shift += len(corrected_item) - len(cur_item)
+                applied_end = max(applied_end, end_idx)
+        if stats is not None:
+            stats.blocks += 1
+            stats.lm_calls_per_block.observe(stats.lm_calls - lm_calls)
+        return blk, tuple(details)
+
+    def correct_batch(self, texts, workers=None, chunksize=None, **kwargs):
+        """
+        批量纠错。模型与词典加载后再 fork 工作进程，各进程共享内存，结果顺序与输入一致
+        :param texts: 文本列表
+        :param workers: 进程数，默认 CPU 核数，1 表示在当前进程内执行
+        :param chunksize: 每个任务包含的文本数，默认按文本数与进程数估算
+        :param kwargs: 传给 correct 的检测开关，如 is_ngram=False
+        :return: list of (corrected_text, details, error)，出错的文本保持原样，error 为异常信息，否则为 None
+        """
+        with CorrectorPool(self, workers) as pool:
+            return pool.map(texts, chunksize, **kwargs)
+
+    def correct_series(self, series, workers=None, chunksize=None, **kwargs):
+        """
+        纠正 pd.Series，相同的值只纠错一次，见 frame.correct_series
+        :return: pd.DataFrame，corrected 与 details 两列，索引与 series 相同
+        """
+        from .frame import correct_series
+        return correct_series(self, series, workers=workers, chunksize=chunksize, **kwargs)
+
+    def correct_frame(self, frame, columns=None, workers=None, chunksize=None, **kwargs):
+        """
+        纠正 pd.DataFrame 的若干列，全部列合并去重后只纠错一次，见 frame.correct_frame
+        :return: pd.DataFrame，原表副本加上 <列名>_corrected、<列名>_details 列
+        """
+        from .frame import correct_frame
+        return correct_frame(self, frame, columns=columns, workers=workers, chunksize=chunksize, **kwargs)
+
+    def correct_stream(self, texts, workers=1, chunksize=64, **kwargs):
+        """
+        流式纠错：按需读取输入，分块并行处理，按输入顺序产出结果，内存占用有上限
+        :param texts: 任意可迭代的文本序列，如逐行读取的文件
+        :param workers: 进程数，1 表示在当前进程内执行
+        :param chunksize: 每个任务包含的文本数
+        :param kwargs: 传给 correct 的检测开关
+        :return: generator of (corrected_text, details, error)
+        """
+        with CorrectorPool(self, workers) as pool:
+            for result in pool.imap(texts, chunksize, **kwargs):
+                yield result
@@ -0,0 +1,385 @@
+#!usr/bin/env python
+#-*- coding:utf-8 -*-
+"""
+合成错误基准：在干净文本中按 same_pinyin、same_stroke、custom_confusion 注入错误，
+对每种检测开关组合测量 Corrector.correct 的吞吐（字/秒）、p50/p99 延迟与字级准确率、召回率，结果写成 JSON，
+可与其他提交的结果对比。默认使用随包附带的干净文本与字级三元 ARPA 模型、jieba 自带词典，完全离线运行。
+
+    python -m simplecorrector.benchmark --output bench.json
+    python -m simplecorrector.benchmark --output bench.json --compare baseline.json --max_slowdown 0.1
+
+附带的语言模型由同一份干净文本训练，准确率、召回率的绝对值偏高，只用于前后对比。
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from difflib import SequenceMatcher
+
+import numpy as np
+
+from . import Corrector
+from .lm.arpa import write_arpa
+from .utils.ac_automaton import AhoCorasick
+from .utils.cli import add_corrector_arguments, data_dir
+from .utils.logger import logger
+from .utils.text_utils import is_chinese
+
+BENCHMARK_VERSION = 1
+DETECTORS = ('confusion', 'token', 'wordgram', 'ngram')
+bench_dir = os.path.join(data_dir, 'bench')
+default_corpus_path = os.path.join(bench_dir, 'clean.txt')
+default_lm_path = os.path.join(bench_dir, 'lm.arpa')
+
+
+def jieba_dict_path():
+    """jieba 自带词典，格式为“词 词频 词性”，可直接作为 word_dict"""
+    import jieba
+    return os.path.join(os.path.dirname(os.path.abspath(jieba.__file__)), 'dict.txt')
+
+
+def load_corpus(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def build_lm(corpus_path=default_corpus_path, lm_path=default_lm_path, order=3):
+    """
+    由干净文本训练字级 ARPA 模型，用于重新生成随包附带的基准模型
+    :return: list, 各阶 n-gram 数
+    """
+    return write_arpa(lm_path, [list(s) for s in load_corpus(corpus_path)], order)
+
+
+def detector_combinations():
+    """
+    :return: list of (名称, 检测开关)，全部非空组合，如 ('confusion+ngram', {'is_confusion': True, ...})
+    """
+    result = []
+    for mask in range(1, 1 << len(DETECTORS)):
+        names = [name for i, name in enumerate(DETECTORS) if mask & (1 << i)]
+        flags = dict(('is_%s' % name, name in names) for name in DETECTORS)
+        result.append(('+'.join(names), flags))
+    return sorted(result, key=lambda x: (-len(x[0].split('+')), x[0]))
+
+
+class ErrorInjector(object):
+    """
+        按固定随机种子在句子中注入错误：同音字、形近字替换单字，混淆集把本体替换为等长的变体。
+        每处错误先等概率选来源，再在该来源可用的位置中随机选，结果只取决于种子与输入。
+    """
+
+    def __init__(self, same_pinyin_dict, same_stroke_dict, confusion_dict, seed=0):
+        """
+        :param same_pinyin_dict: dict, {字: 同音字集合}
+        :param same_stroke_dict: dict, {字: 形近字集合}
+        :param confusion_dict: dict, {变体: 本体}
+        :param seed: 随机种子
+        """
+        self.rng = random.Random(seed)
+        # 集合的遍历顺序随哈希种子变化，全部排序后再抽样
+        self.similar_chars = {
+            'pinyin': self._char_table(same_pinyin_dict),
+            'stroke': self._char_table(same_stroke_dict),
+        }
+        self.variants = {}
+        for variant, origin in confusion_dict.items():
+            if variant != origin and len(variant) == len(origin):
+                self.variants.setdefault(origin, []).append(variant)
+        for origin in self.variants:
+            self.variants[origin].sort()
+        self.origin_matcher = AhoCorasick(self.variants)
+
+    @staticmethod
+    def _char_table(d):
+        table = {}
+        for c, similar in d.items():
+            similar = sorted(x for x in similar if x != c and len(x) == 1 and is_chinese(x))
+            if is_chinese(c) and similar:
+                table[c] = similar
+        return table
+
+    @classmethod
+    def from_corrector(cls, corrector, seed=0):
+        return cls(corrector.same_pinyin_dict, corrector.same_stroke_dict, corrector.confusion_dict, seed)
+
+    def _options(self, sentence):
+        options = {'confusion': [(begin, end, self.variants[word])
+                                 for begin, end, word in self.origin_matcher.findall(sentence)]}
+        for source, table in self.similar_chars.items():
+            options[source] = [(i, i + 1, table[c]) for i, c in enumerate(sentence) if c in table]
+        return options
+
+    def inject(self, sentence, n_errors=1):
+        """
+        :param sentence: 干净句子
+        :param n_errors: 注入的错误数，可用位置不足时少于该值
+        :return: (含错句子, list of dict)，错误均为等长替换，位置在两句中一致
+        """
+        options = self._options(sentence)
+        chars = list(sentence)
+        taken = set()
+        errors = []
+        for _ in range(n_errors):
+            available = {}
+            for source in sorted(options):
+                spans = [x for x in options[source] if not taken.intersection(range(x[0], x[1]))]
+                if spans:
+                    available[source] = spans
+            if not available:
+                break
+            source = self.rng.choice(sorted(available))
+            begin, end, replacements = self.rng.choice(available[source])
+            replaced = self.rng.choice(replacements)
+            chars[begin:end] = list(replaced)
+            taken.update(range(begin, end))
+            errors.append({'begin': begin, 'end': end, 'original': sentence[begin:end],
+                           'replaced': replaced, 'source': source})
+        return ''.join(chars), sorted(errors, key=lambda x: x['begin'])
+
+    def build_dataset(self, sentences, error_ratio=0.8, n_errors=1):
+        """
+        :param sentences: 干净句子列表
+        :param error_ratio: 注入错误的句子比例，其余保持干净，用于统计误报
+        :return: list of dict(clean, noisy, errors)
+        """
+        records = []
+        for sentence in sentences:
+            if self.rng.random() < error_ratio:
+                noisy, errors = self.inject(sentence, n_errors)
+            else:
+                noisy, errors = sentence, []
+            records.append({'clean': sentence, 'noisy': noisy, 'errors': errors})
+        return records
+
+
+def changed_positions(source, target):
+    """
+    :return: dict, {source 中被改动的位置: 改后的字}，长度不等的改动记为 None
+    """
+    if len(source) == len(target):
+        return dict((i, b) for i, (a, b) in enumerate(zip(source, target)) if a != b)
+    result = {}
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, source, target, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            continue
+        for k in range(i1, i2):
+            result[k] = target[j1 + k - i1] if i2 - i1 == j2 - j1 else None
+    return result
+
+
+def _ratio(a, b):
+    return a / float(b) if b else None
+
+
+def _f1(p, r):
+    if not p or not r:
+        return None
+    return 2 * p * r / (p + r)
+
+
+def evaluate(records, outputs):
+    """
+    字级评估
+    :param records: build_dataset 的结果
+    :param outputs: 对应的纠正结果
+    :return: dict, 检测与纠正的准确率、召回率、F1，以及整句完全正确的比例
+    """
+    n_errors = n_changes = detected = corrected = exact = 0
+    for record, output in zip(records, outputs):
+        clean, noisy = record['clean'], record['noisy']
+        errors = set(i for i, (a, b) in enumerate(zip(clean, noisy)) if a != b)
+        changes = changed_positions(noisy, output)
+        n_errors += len(errors)
+        n_changes += len(changes)
+        for i in errors.intersection(changes):
+            detected += 1
+            if changes[i] == clean[i]:
+                corrected += 1
+        exact += output == clean
+    result = {'errors': n_errors, 'changes': n_changes, 'sentence_accuracy': _ratio(exact, len(records))}
+    for name, tp in (('detection', detected), ('correction', corrected)):
+        p, r = _ratio(tp, n_changes), _ratio(tp, n_errors)
+        result[name] = {'precision': p, 'recall': r, 'f1': _f1(p, r)}
+    return result
+
+
+def run_combination(corrector, records, flags, repeat=1):
+    """
+    :return: dict, 吞吐、延迟与准确率
+    """
+    if corrector.stats is not None:
+        corrector.stats.reset()
+    if corrector.tiers is not None:
+        corrector.tiers.reset()
+    corrector.clear_cache()
+    latencies = []
+    outputs = None
+    chars = sum(len(r['noisy']) for r in records)
+    elapsed = 0.0
+    for _ in range(repeat):
+        run_outputs = []
+        for record in records:
+            start = time.perf_counter()
+            text_new, _ = corrector.correct(record['noisy'], **flags)
+            latency = time.perf_counter() - start
+            elapsed += latency
+            latencies.append(latency * 1000)
+            run_outputs.append(text_new)
+        if outputs is None:
+            outputs = run_outputs
+    p50, p99 = np.percentile(latencies, [50, 99])
+    result = {
+        'flags': flags,
+        'chars_per_sec': chars * repeat / elapsed if elapsed else None,
+        'latency_ms': {'p50': float(p50), 'p99': float(p99), 'mean': float(np.mean(latencies)),
+                       'max': float(np.max(latencies))},
+    }
+    result.update(evaluate(records, outputs))
+    if corrector.tiers is not None:
+        result['tiers'] = corrector.tiers.counts()
+    if corrector.stats is not None:
+        result['stages'] = corrector.get_stats()
+    return result
+
+
+def _git_commit():
+    try:
+        out = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                      cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(corrector, sentences, seed=0, error_ratio=0.8, n_errors=1, repeat=1, combinations=None):
+    """
+    :param corrector: 已加载的 Corrector，建议关闭短句缓存（block_cache_bytes=0）
+    :param sentences: 干净句子列表
+    :param seed: 注入错误的随机种子
+    :param repeat: 每种组合重复纠错的轮数，延迟取全部轮次，准确率取第一轮
+    :param combinations: 检测开关组合名称列表，默认全部
+    :return: dict, 可直接 JSON 序列化
+    """
+    records = ErrorInjector.from_corrector(corrector, seed).build_dataset(sentences, error_ratio, n_errors)
+    combos = detector_combinations()
+    if combinations:
+        combos = [(name, flags) for name, flags in combos if name in combinations]
+    # 预热：分词器词典、模型页面与各处 lru_cache 在计时前就绪
+    initialize = getattr(corrector.tokenizer, 'initialize', None)
+    if initialize is not None:
+        initialize()
+    for record in records:
+        corrector.correct(record['noisy'])
+    meta = {
+        'version': BENCHMARK_VERSION,
+        'commit': _git_commit(),
+        'python': sys.version.split()[0],
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'seed': seed,
+        'sentences': len(records),
+        'chars': sum(len(r['noisy']) for r in records),
+        'injected_errors': sum(len(r['errors']) for r in records),
+        'repeat': repeat,
+        'lm_model_path': corrector.lm_model_path,
+        'word_dict_path': corrector.word_dict_path,
+        'tiers': corrector.tiers.to_dict() if corrector.tiers is not None else None,
+    }
+    results = {}
+    for name, flags in combos:
+        results[name] = run_combination(corrector, records, flags, repeat)
+        logger.info('%-30s %10.1f chars/s  p50 %7.2f ms  p99 %7.2f ms  correction f1 %s' % (
+            name, results[name]['chars_per_sec'] or 0, results[name]['latency_ms']['p50'],
+            results[name]['latency_ms']['p99'], results[name]['correction']['f1']))
+    return {'meta': meta, 'results': results}
+
+
+def compare(base, current):
+    """
+    对比两次基准结果
+    :param base: 基线结果
+    :param current: 当前结果
+    :return: list of dict，每种组合的吞吐、p99 延迟、纠正 F1 的前后值与变化
+    """
+    rows = []
+    for name, result in current['results'].items():
+        old = base['results'].get(name)
+        if old is None:
+            continue
+        row = {'combination': name}
+        for key, get in (('chars_per_sec', lambda x: x['chars_per_sec']),
+                         ('p99_ms', lambda x: x['latency_ms']['p99']),
+                         ('correction_f1', lambda x: x['correction']['f1'])):
+            a, b = get(old), get(result)
+            change = (b - a) / a if a and b is not None else None
+            row[key] = {'base': a, 'current': b, 'change': change}
+        rows.append(row)
+    return rows
+
+
+def format_comparison(rows):
+    def fmt(value, change):
+        if value is None:
+            return '%10s %8s' % ('-', '')
+        return '%10.2f %+7.1f%%' % (value, change * 100) if change is not None else '%10.2f %8s' % (value, '')
+
+    lines = ['%-30s %19s %19s %19s' % ('combination', 'chars/s', 'p99 ms', 'correction f1')]
+    for row in rows:
+        lines.append('%-30s %s %s %s' % (row['combination'], fmt(row['chars_per_sec']['current'], row['chars_per_sec']['change']),
+                                         fmt(row['p99_ms']['current'], row['p99_ms']['change']),
+                                         fmt(row['correction_f1']['current'], row['correction_f1']['change'])))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='simplecorrector 合成错误基准')
+    parser.add_argument('--corpus', default=default_corpus_path, help='干净文本，每行一句')
+    parser.add_argument('--output', default=None, help='结果 JSON 路径，默认输出到标准输出')
+    parser.add_argument('--compare', default=None, help='与之对比的基线结果 JSON')
+    parser.add_argument('--max_slowdown', type=float, default=None,
+                        help='任一组合吞吐下降超过该比例（如 0.1）时以非零状态退出')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--error_ratio', type=float, default=0.8, help='注入错误的句子比例')
+    parser.add_argument('--errors_per_sentence', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--combinations', nargs='*', default=None, help='只运行指定组合，如 confusion+ngram')
+    parser.add_argument('--stats', action='store_true', help='结果中附带各阶段耗时')
+    parser.add_argument('--rebuild_lm', action='store_true', help='由 --corpus 重新训练 --lm_model_path 指向的 ARPA 模型')
+    add_corrector_arguments(parser, lm_model_path=default_lm_path, word_dict_path=jieba_dict_path())
+    # 重复轮次会命中短句缓存，基准默认关闭
+    parser.set_defaults(block_cache_bytes=0)
+    args = parser.parse_args(argv)
+
+    if args.rebuild_lm:
+        logger.info('ngram counts: %s' % build_lm(args.corpus, args.lm_model_path))
+    args.enable_stats = args.stats
+    corrector = Corrector(args)
+    result = run_benchmark(corrector, load_corpus(args.corpus), seed=args.seed, error_ratio=args.error_ratio,
+                           n_errors=args.errors_per_sentence, repeat=args.repeat,
+                           combinations=args.combinations)
+    text = json.dumps(result, ensure_ascii=False, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            rows = compare(json.load(f), result)
+        print(format_comparison(rows), file=sys.stderr)
+        if args.max_slowdown is not None:
+            slow = [row['combination'] for row in rows
+                    if row['chars_per_sec']['change'] is not None and row['chars_per_sec']['change'] < -args.max_slowdown]
+            if slow:
+                logger.error('throughput regression over %.0f%%: %s' % (args.max_slowdown * 100, ', '.join(slow)))
+                return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
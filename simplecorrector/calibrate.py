@@ -0,0 +1,99 @@
+#!usr/bin/env python
+#-*- coding:utf-8 -*-
+"""
+由样本语料拟合分层检测的按长度阈值。
+
+    python -m simplecorrector.calibrate corpus.txt tiers.json --quantile 0.1 --lm_model_path lm.bin --check
+    python -m simplecorrector.server --tier_thresholds_path tiers.json --lm_model_path lm.bin ...
+
+样本语料应为与线上文本同分布的干净文本，每行一段。quantile 约为干净短句进入完整检测的比例；
+--check 会按 benchmark 的方式注入错误，报告含错短句仍进入完整检测的比例，用于权衡速度与召回。
+"""
+
+import argparse
+import json
+
+from . import Corrector
+from .benchmark import ErrorInjector
+from .utils.cli import add_corrector_arguments
+from .utils.logger import logger
+from .utils.text_utils import split_long_text
+from .utils.tiers import TierThresholds
+
+
+def _blocks(corrector, text):
+    return [blk for blk, _ in split_long_text(corrector._process_text(text), include_symbol=True) if blk.strip()]
+
+
+def block_samples(corrector, texts):
+    """
+    :param corrector: Corrector
+    :param texts: 文本序列
+    :return: list of (字数, 平均每字 log10 概率)，与 correct 中的切分方式一致
+    """
+    samples = []
+    for text in texts:
+        for blk in _blocks(corrector, text):
+            samples.append(corrector.block_score(blk))
+    return samples
+
+
+def calibrate_tiers(corrector, texts, quantile=0.1, min_samples=50):
+    """
+    :return: TierThresholds
+    """
+    return TierThresholds.fit(block_samples(corrector, texts), quantile, min_samples)
+
+
+def check_tiers(corrector, tiers, texts, seed=0):
+    """
+    估计阈值的效果
+    :param tiers: TierThresholds
+    :param texts: 干净文本
+    :return: dict, 干净短句走快速路径的比例，注入错误的短句进入完整检测的比例
+    """
+    def full_path(blk):
+        length, score = corrector.block_score(blk)
+        return score is not None and score < tiers.threshold(length)
+
+    clean_blocks = full_clean = error_blocks = caught = 0
+    records = ErrorInjector.from_corrector(corrector, seed).build_dataset(texts, error_ratio=1.0)
+    for record in records:
+        clean = _blocks(corrector, record['clean'])
+        noisy = _blocks(corrector, record['noisy'])
+        for blk in clean:
+            clean_blocks += 1
+            full_clean += full_path(blk)
+        # 注入的错误都是等长替换，切分结果一一对应
+        for a, b in zip(clean, noisy):
+            if a != b:
+                error_blocks += 1
+                caught += full_path(b)
+    return {'clean_blocks': clean_blocks,
+            'clean_fast_ratio': 1 - full_clean / float(clean_blocks) if clean_blocks else None,
+            'error_blocks': error_blocks,
+            'error_full_ratio': caught / float(error_blocks) if error_blocks else None}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='拟合分层检测阈值')
+    parser.add_argument('corpus', help='干净样本语料，UTF-8，每行一段')
+    parser.add_argument('output', help='阈值 JSON 输出路径')
+    parser.add_argument('--quantile', type=float, default=0.1)
+    parser.add_argument('--min_samples', type=int, default=50, help='每个长度分段的最少短句数')
+    parser.add_argument('--check', action='store_true', help='注入错误估计快速路径比例与漏检比例')
+    parser.add_argument('--seed', type=int, default=0)
+    add_corrector_arguments(parser)
+    args = parser.parse_args(argv)
+    corrector = Corrector(args)
+    with open(args.corpus, 'r', encoding='utf-8') as f:
+        texts = [line.strip() for line in f if line.strip()]
+    tiers = calibrate_tiers(corrector, texts, args.quantile, args.min_samples)
+    tiers.save(args.output)
+    logger.info('%d length buckets written to %s' % (len(tiers.lengths), args.output))
+    if args.check:
+        print(json.dumps(check_tiers(corrector, tiers, texts, args.seed), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!usr/bin/env python
+#-*- coding:utf-8 -*-
+"""
+pandas Series/DataFrame 批量纠错：相同的字符串只纠错一次，唯一值交给多进程纠错池，结果按原索引展开。
+pandas 只在调用时导入，不是 simplecorrector 的必需依赖。
+"""
+
+import numpy as np
+
+from .utils.logger import logger
+
+
+def _correct_unique(corrector, values, workers=None, chunksize=None, **kwargs):
+    """
+    :param values: 一维数组或序列
+    :return: (纠正后文本数组, details 数组, error 数组)，与 values 等长；非字符串与缺失值原样返回，details 为空
+    """
+    import pandas as pd
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    uniques = np.asarray(uniques, dtype=object)
+    positions = [i for i, u in enumerate(uniques) if isinstance(u, str)]
+    results = corrector.correct_batch([uniques[i] for i in positions], workers=workers, chunksize=chunksize,
+                                      **kwargs)
+
+    # 末尾多放一格给缺失值（factorize 编码为 -1），展开后再填回原值
+    n = len(uniques)
+    texts = np.empty(n + 1, dtype=object)
+    texts[:n] = uniques
+    details = np.empty(n + 1, dtype=object)
+    for i in range(n + 1):
+        details[i] = []
+    errors = np.full(n + 1, None, dtype=object)
+    failed = 0
+    for i, (text_new, text_details, error) in zip(positions, results):
+        texts[i] = text_new
+        details[i] = text_details
+        errors[i] = error
+        if error is not None:
+            failed += 1
+            if failed == 1:
+                logger.warning('correction failed for %r: %s' % (uniques[i], error))
+    if failed:
+        logger.warning('%d of %d unique values failed to correct and were left unchanged' % (failed, len(positions)))
+    logger.debug('corrected %d unique values for %d rows' % (len(positions), len(codes)))
+    missing = codes < 0
+    index = np.where(missing, n, codes)
+    texts, details, errors = texts[index], details[index], errors[index]
+    if missing.any():
+        texts[missing] = np.asarray(values, dtype=object)[missing]
+    return texts, details, errors
+
+
+def correct_series(corrector, series, workers=None, chunksize=None, text_column='corrected',
+                   details_column='details', error_column=None, **kwargs):
+    """
+    纠正 pd.Series，相同的值只纠错一次
+    :param corrector: Corrector
+    :param series: pd.Series
+    :param workers: 进程数，默认 CPU 核数，1 表示在当前进程内执行
+    :param chunksize: 每个任务包含的文本数
+    :param text_column: 纠正后文本的列名
+    :param details_column: details 的列名；重复值的各行共享同一个 details 对象
+    :param error_column: 不为 None 时加入该列记录出错信息，出错的文本保持原样
+    :param kwargs: 传给 correct 的检测开关，如 is_ngram=False
+    :return: pd.DataFrame，索引与 series 相同
+    """
+    import pandas as pd
+    texts, details, errors = _correct_unique(corrector, series.to_numpy(dtype=object), workers, chunksize, **kwargs)
+    result = pd.DataFrame({text_column: texts, details_column: details}, index=series.index)
+    if error_column is not None:
+        result[error_column] = errors
+    return result
+
+
+def correct_frame(corrector, frame, columns=None, workers=None, chunksize=None, text_suffix='_corrected',
+                  details_suffix='_details', error_suffix=None, **kwargs):
+    """
+    纠正 pd.DataFrame 的若干列，全部列的值合并去重后只纠错一次
+    :param corrector: Corrector
+    :param frame: pd.DataFrame
+    :param columns: 待纠错的列，默认全部 object 类型的列
+    :param text_suffix: 纠正后文本列名后缀，如 review -> review_corrected
+    :param details_suffix: details 列名后缀
+    :param error_suffix: 不为 None 时另加出错信息列
+    :param kwargs: 传给 correct 的检测开关
+    :return: pd.DataFrame，原表副本加上结果列
+    """
+    if columns is None:
+        columns = [c for c in frame.columns if frame[c].dtype == object or str(frame[c].dtype) in ('string', 'str')]
+    result = frame.copy()
+    if not columns or not len(frame):
+        for column in columns:
+            result[column + text_suffix] = frame[column]
+            result[column + details_suffix] = [[] for _ in range(len(frame))]
+        return result
+    values = np.concatenate([frame[column].to_numpy(dtype=object) for column in columns])
+    texts, details, errors = _correct_unique(corrector, values, workers, chunksize, **kwargs)
+    n = len(frame)
+    for k, column in enumerate(columns):
+        result[column + text_suffix] = texts[k * n:(k + 1) * n]
+        result[column + details_suffix] = details[k * n:(k + 1) * n]
+        if error_suffix is not None:
+            result[column + error_suffix] = errors[k * n:(k + 1) * n]
+    return result
@@ -1,16 +1,305 @@
 #!usr/bin/env python
 #-*- coding:utf-8 -*-
+"""
+纯 Python/NumPy 的回退 n-gram 语言模型，不依赖 kenlm。
 
-class Model():
+模型按层存成排序 trie：第 1 层以词编号为下标，第 n 层按 (父节点, 词编号) 排序，
+父节点的子节点区间由 child_offsets 给出，查找时在区间内二分。全部数组写入一个文件，以 mmap 方式打开。
+接口与 kenlm.Model 一致（score、perplexity、order、State、BaseScore 等），可直接交给 Corrector。
+
+    python -m simplecorrector.lm.NLM build corpus.txt lm.nlm --order 3 --chars
+    python -m simplecorrector.lm.NLM convert lm.arpa lm.nlm
+"""
+
+import argparse
+from bisect import bisect_left
+
+import numpy as np
+
+from .arpa import BOS, EOS, UNK, count_ngrams, estimate, read_arpa
+from ..utils.logger import logger
+from ..utils.snapshot import read_arrays, read_meta, write_arrays
+from ..utils.string_table import StringTable
+
+NLM_FORMAT = 'nlm'
+NLM_VERSION = 1
+# 模型缺少 <unk> 时补入的 log10 概率，与 kenlm 相同
+MISSING_UNK_PROB = -100.0
+
+
+class State(object):
     """
-        N-gram LM
+        语言模型状态：参与后续计分的上文词编号，最近的词在前
     """
+    __slots__ = ('words',)
+
+    def __init__(self, words=()):
+        self.words = words
+
+    def __copy__(self):
+        return State(self.words)
+
+    def __eq__(self, other):
+        return isinstance(other, State) and self.words == other.words
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.words)
+
+    def __len__(self):
+        return len(self.words)
+
+
+def is_model_file(path):
+    """
+    :return: bool, path 是否为本模块写出的模型文件
+    """
+    try:
+        header = read_meta(path)
+    except (IOError, OSError, ValueError):
+        return False
+    return header is not None and header[0].get('format') == NLM_FORMAT
+
+
+def model_to_arrays(model):
+    """
+    把各阶 n-gram 表转为 trie 数组
+    :param model: list of dict，[n-1] 为 {词元组: (log10 概率, log10 回退权重)}，见 arpa.estimate / arpa.read_arpa
+    :return: dict of np.ndarray
+    """
+    order = len(model)
+    unigrams = model[0]
+    if (UNK,) not in unigrams:
+        # 未登录词都回退到 <unk>，缺失时按 kenlm 的做法补一个固定概率
+        logger.warning('model has no %s, substituting log10 probability %.1f' % (UNK, MISSING_UNK_PROB))
+        unigrams = dict(unigrams)
+        unigrams[(UNK,)] = (MISSING_UNK_PROB, 0.0)
+    vocab = StringTable.build(w for (w,) in unigrams)
+    word_ids = dict((w, i) for i, w in enumerate(vocab))
+    arrays = vocab.to_arrays('vocab.')
+    prob = np.zeros(len(vocab), dtype=np.float32)
+    bow = np.zeros(len(vocab), dtype=np.float32)
+    for (w,), (p, b) in unigrams.items():
+        prob[word_ids[w]] = p
+        bow[word_ids[w]] = b
+    arrays['1.prob'] = prob
+    arrays['1.bow'] = bow
+    # 上一层 n-gram 到节点编号
+    nodes = dict(((w,), word_ids[w]) for (w,) in unigrams)
+    for n in range(2, order + 1):
+        entries = []
+        for gram, (p, b) in model[n - 1].items():
+            parent = nodes.get(gram[:-1])
+            word = word_ids.get(gram[-1])
+            if parent is None or word is None:
+                raise ValueError('n-gram %s has no (n-1)-gram prefix or unknown word' % ' '.join(gram))
+            entries.append((parent, word, p, b, gram))
+        entries.sort(key=lambda x: (x[0], x[1]))
+        n_parents = len(arrays['%d.prob' % (n - 1)])
+        counts = np.bincount(np.array([x[0] for x in entries], dtype=np.int64), minlength=n_parents)
+        offsets = np.zeros(n_parents + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(counts)
+        arrays['%d.child_offsets' % (n - 1)] = offsets
+        arrays['%d.words' % n] = np.array([x[1] for x in entries], dtype=np.int32)
+        arrays['%d.prob' % n] = np.array([x[2] for x in entries], dtype=np.float32)
+        if n < order:
+            arrays['%d.bow' % n] = np.array([x[3] for x in entries], dtype=np.float32)
+        nodes = dict((x[4], i) for i, x in enumerate(entries))
+    return arrays
+
+
+def write_model(path, model):
+    """
+    :param path: 输出路径
+    :param model: 各阶 n-gram 表
+    """
+    arrays = model_to_arrays(model)
+    # 按数组计数，包含补入的 <unk>
+    meta = {'format': NLM_FORMAT, 'version': NLM_VERSION, 'order': len(model),
+            'counts': [len(arrays['%d.prob' % n]) for n in range(1, len(model) + 1)]}
+    write_arrays(path, meta, arrays)
+
+
+class Model(object):
+    """
+        N-gram LM，数组 trie + 回退，接口与 kenlm.Model 一致
+    """
+    State = State
 
     def __init__(self, model_path):
+        """
+        :param model_path: build / from_arpa 写出的模型文件
+        """
         self.model_path = model_path
+        self.path = model_path
+        result = read_arrays(model_path)
+        if result is None or result[0].get('format') != NLM_FORMAT:
+            raise ValueError('not an NLM model file: %s' % model_path)
+        meta, arrays = result
+        if meta.get('version') != NLM_VERSION:
+            raise ValueError('unsupported NLM version %s: %s' % (meta.get('version'), model_path))
+        self.order = meta['order']
+        self.counts = meta['counts']
+        self.vocab = StringTable.from_arrays(arrays, 'vocab.')
+        self._unk = self.vocab.index(UNK)
+        if self._unk < 0:
+            # 否则未登录词会取到编号 -1，即最后一个词的概率
+            raise ValueError('NLM model has no %s entry, rebuild it with build/convert: %s' % (UNK, model_path))
+        self._bos = self.vocab.index(BOS)
+        # 逐元素访问 memoryview 比 numpy 标量快得多
+        self._prob = [memoryview(arrays['%d.prob' % n]).cast('B').cast('f') for n in range(1, self.order + 1)]
+        self._bow = [memoryview(arrays['%d.bow' % n]).cast('B').cast('f') for n in range(1, self.order)]
+        self._words = [None] + [memoryview(arrays['%d.words' % n]).cast('B').cast('i')
+                                for n in range(2, self.order + 1)]
+        self._child_offsets = [memoryview(arrays['%d.child_offsets' % n]).cast('B').cast('q')
+                               for n in range(1, self.order)]
+        self._arrays = arrays
+
+    @classmethod
+    def build(cls, sentences, path, order=3, discount=0.7):
+        """
+        由语料训练模型（插值绝对折扣）并写出
+        :param sentences: 可迭代的句子，每句为词或字列表
+        :param path: 输出路径
+        :return: Model
+        """
+        write_model(path, estimate(count_ngrams(sentences, order), discount))
+        return cls(path)
+
+    @classmethod
+    def from_arpa(cls, arpa_path, path):
+        """
+        把 ARPA 模型转换为本格式
+        :return: Model
+        """
+        write_model(path, read_arpa(arpa_path))
+        return cls(path)
+
+    def __contains__(self, word):
+        return self.vocab.index(word) >= 0
+
+    def _word_id(self, word):
+        i = self.vocab.index(word)
+        return self._unk if i < 0 else i
+
+    def _find(self, ids):
+        """
+        :param ids: 词编号序列，按时间顺序
+        :return: 该 n-gram 在第 len(ids) 层的节点编号，不存在时返回 -1
+        """
+        node = ids[0]
+        for n in range(1, len(ids)):
+            offsets = self._child_offsets[n - 1]
+            lo, hi = offsets[node], offsets[node + 1]
+            words = self._words[n]
+            i = bisect_left(words, ids[n], lo, hi)
+            if i == hi or words[i] != ids[n]:
+                return -1
+            node = i
+        return node
+
+    def _score_id(self, context, word):
+        """
+        :param context: 上文词编号，最近的在前
+        :param word: 词编号
+        :return: (log10 概率, 匹配到的 n-gram 长度)
+        """
+        # 从最长的上文开始找存在的 n-gram
+        for k in range(len(context), -1, -1):
+            ids = context[:k][::-1] + (word,)
+            node = self._find(ids)
+            if node >= 0:
+                break
+        score = self._prob[k][node]
+        # 未能匹配的更长上文，累加其回退权重
+        for j in range(k + 1, len(context) + 1):
+            ctx = self._find(context[:j][::-1])
+            if ctx >= 0:
+                score += self._bow[j - 1][ctx]
+        return score, k + 1
+
+    def _next_context(self, context, word, length):
+        return ((word,) + context[:length - 1])[:self.order - 1]
+
+    def BeginSentenceWrite(self, state):
+        state.words = (self._bos,)
+
+    def NullContextWrite(self, state):
+        state.words = ()
+
+    def BaseScore(self, in_state, word, out_state):
+        """
+        :return: log10 p(word | in_state)，out_state 写入新状态
+        """
+        word = self._word_id(word)
+        score, length = self._score_id(in_state.words, word)
+        out_state.words = self._next_context(in_state.words, word, length)
+        return score
+
+    def full_scores(self, sentence, bos=True, eos=True):
+        """
+        :return: generator of (log10 概率, 匹配的 n-gram 长度, 是否为未登录词)，与 kenlm 相同
+        """
+        context = (self._bos,) if bos else ()
+        words = sentence.split()
+        if eos:
+            words.append(EOS)
+        for w in words:
+            word = self._word_id(w)
+            score, length = self._score_id(context, word)
+            context = self._next_context(context, word, length)
+            yield score, length, word == self._unk
+
+    def score(self, sentence, bos=True, eos=True):
+        """
+        :param sentence: 以空格分隔的词序列
+        :return: log10 概率，与 kenlm 一样以 float32 累加
+        """
+        context = (self._bos,) if bos else ()
+        total = np.float32(0.0)
+        words = sentence.split()
+        if eos:
+            words.append(EOS)
+        for w in words:
+            word = self._word_id(w)
+            s, length = self._score_id(context, word)
+            context = self._next_context(context, word, length)
+            total += np.float32(s)
+        return float(total)
+
+    def perplexity(self, sentence):
+        words = len(sentence.split()) + 1
+        return 10.0 ** (-self.score(sentence) / words)
+
+    PPL = perplexity
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='NLM n-gram 语言模型')
+    sub = parser.add_subparsers(dest='command')
+    build = sub.add_parser('build', help='由语料训练')
+    build.add_argument('corpus', help='UTF-8 文本，每行一句，词以空格分隔')
+    build.add_argument('output')
+    build.add_argument('--order', type=int, default=3)
+    build.add_argument('--discount', type=float, default=0.7)
+    build.add_argument('--chars', action='store_true', help='按字切分，忽略空格')
+    convert = sub.add_parser('convert', help='由 ARPA 文件转换')
+    convert.add_argument('arpa')
+    convert.add_argument('output')
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        with open(args.corpus, 'r', encoding='utf-8') as f:
+            sentences = [list(line.strip()) if args.chars else line.split() for line in f]
+        model = Model.build([s for s in sentences if s], args.output, args.order, args.discount)
+    elif args.command == 'convert':
+        model = Model.from_arpa(args.arpa, args.output)
+    else:
+        parser.print_help()
+        return
+    print('%s: order %d, ngram counts %s' % (args.output, model.order, model.counts))
 
-    def score(self, sentence):
-        pass
 
-    def PPL(self, sentence):
-        pass
\ No newline at end of file
+if __name__ == '__main__':
+    main()
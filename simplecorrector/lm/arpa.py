@@ -0,0 +1,134 @@
+#!usr/bin/env python
+#-*- coding:utf-8 -*-
+"""
+从语料统计 n-gram 并估计插值绝对折扣模型，写出 kenlm 可直接加载的 ARPA 文件。
+只面向小语料（测试、基准用的小模型），全部计数保存在内存中。
+"""
+
+import math
+from collections import Counter, defaultdict
+
+BOS = '<s>'
+EOS = '</s>'
+UNK = '<unk>'
+# ARPA 中 <s> 的概率约定为 log10(0)
+NO_PROB = -99.0
+
+
+def count_ngrams(sentences, order=3):
+    """
+    :param sentences: 可迭代的句子，每句为词或字列表；空白 token 会被忽略
+    :param order: 最大阶数
+    :return: list of Counter, [n-1] 为 n 阶计数，键为词元组，句子首尾加 <s>、</s>
+    """
+    counts = [Counter() for _ in range(order)]
+    for tokens in sentences:
+        words = [BOS] + [w for w in tokens if w.strip()] + [EOS]
+        for n in range(1, order + 1):
+            grams = counts[n - 1]
+            for i in range(len(words) - n + 1):
+                grams[tuple(words[i:i + n])] += 1
+    return counts
+
+
+def estimate(counts, discount=0.7):
+    """
+    插值绝对折扣：p(w|h) = (c(hw) - D) / c(h) + bow(h) * p(w|h')，bow(h) = D * t(h) / c(h)，
+    t(h) 为 h 之后出现过的不同词数。插值后的概率可直接按回退格式存储。
+    :param counts: count_ngrams 的结果
+    :param discount: 折扣 D，0 < D < 1
+    :return: list of dict, [n-1] 为 {词元组: (log10 概率, log10 回退权重)}
+    """
+    order = len(counts)
+    unigrams = dict((k, v) for k, v in counts[0].items() if k != (BOS,))
+    total = float(sum(unigrams.values()))
+    # 折扣出的质量平均分给全部词与 <unk>
+    floor = discount * len(unigrams) / total / (len(unigrams) + 1)
+    probs = [{(UNK,): floor, (BOS,): 0.0}]
+    for gram, c in unigrams.items():
+        probs[0][gram] = (c - discount) / total + floor
+
+    backoffs = [{} for _ in range(order)]
+    for n in range(2, order + 1):
+        context_total = defaultdict(int)
+        context_types = defaultdict(int)
+        for gram, c in counts[n - 1].items():
+            context_total[gram[:-1]] += c
+            context_types[gram[:-1]] += 1
+        for context, c in context_total.items():
+            backoffs[n - 2][context] = discount * context_types[context] / c
+        lower = probs[n - 2]
+        current = {}
+        for gram, c in counts[n - 1].items():
+            context = gram[:-1]
+            current[gram] = (c - discount) / context_total[context] + \
+                backoffs[n - 2][context] * lower[gram[1:]]
+        probs.append(current)
+
+    model = []
+    for n in range(1, order + 1):
+        table = {}
+        for gram, p in probs[n - 1].items():
+            logprob = math.log10(p) if p > 0 else NO_PROB
+            bow = backoffs[n - 1].get(gram)
+            table[gram] = (logprob, math.log10(bow) if bow else 0.0)
+        model.append(table)
+    return model
+
+
+def write_arpa(path, sentences, order=3, discount=0.7):
+    """
+    从语料估计模型并写出 ARPA 文件
+    :param path: 输出路径
+    :param sentences: 可迭代的句子，每句为词或字列表
+    :param order: 最大阶数
+    :param discount: 折扣
+    :return: list, 各阶 n-gram 数
+    """
+    model = estimate(count_ngrams(sentences, order), discount)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\\data\\\n')
+        for n, table in enumerate(model, 1):
+            f.write('ngram %d=%d\n' % (n, len(table)))
+        for n, table in enumerate(model, 1):
+            f.write('\n\\%d-grams:\n' % n)
+            for gram in sorted(table):
+                logprob, bow = table[gram]
+                if n < order:
+                    f.write('%.6f\t%s\t%.6f\n' % (logprob, ' '.join(gram), bow))
+                else:
+                    f.write('%.6f\t%s\n' % (logprob, ' '.join(gram)))
+        f.write('\n\\end\\\n')
+    return [len(table) for table in model]
+
+
+def read_arpa(path):
+    """
+    读取 ARPA 文件
+    :param path: ARPA 路径
+    :return: list of dict, 与 estimate 的结果格式相同，[n-1] 为 {词元组: (log10 概率, log10 回退权重)}
+    """
+    model = []
+    table = None
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line == '\\data\\' or line.startswith('ngram '):
+                continue
+            if line == '\\end\\':
+                break
+            if line.startswith('\\') and line.endswith('-grams:'):
+                n = int(line[1:-len('-grams:')])
+                if n != len(model) + 1:
+                    raise ValueError('unexpected section %s in %s' % (line, path))
+                table = {}
+                model.append(table)
+                continue
+            if table is None:
+                raise ValueError('malformed ARPA file: %s' % path)
+            parts = line.split()
+            n = len(model)
+            gram = tuple(parts[1:1 + n])
+            bow = float(parts[1 + n]) if len(parts) > 1 + n else 0.0
+            table[gram] = (float(parts[0]), bow)
+    return model
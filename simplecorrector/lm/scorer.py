@@ -0,0 +1,148 @@
+#!usr/bin/env python
+#-*- coding:utf-8 -*-
+
+import copy
+import numpy as np
+
+try:
+    import kenlm
+except ImportError:
+    kenlm = None
+
+
+def new_state(lm):
+    """
+    新建语言模型状态对象
+    :param lm: 语言模型
+    :return: State
+    """
+    factory = getattr(lm, 'State', None)
+    if factory is None:
+        factory = kenlm.State
+    return factory()
+
+
+def window_scores(lm, tokens, max_order):
+    """
+    逐位置增量计算全部 n-gram 窗口得分，等价于 lm.score(' '.join(tokens[i:i+n]), bos=False, eos=False)
+    每个起点只从空上下文向后延伸 max_order 步，不再重复拼接字符串
+    :param lm: 语言模型，支持 NullContextWrite/BaseScore 时走增量路径
+    :param tokens: 词或字列表
+    :param max_order: 最大阶数
+    :return: np.array, shape (max_order, len(tokens))，[n-1, i] 为 tokens[i:i+n] 的得分，越界为 nan
+    """
+    size = len(tokens)
+    scores = np.full((max_order, size), np.nan)
+    if not hasattr(lm, 'BaseScore'):
+        for n in range(1, max_order + 1):
+            for i in range(size - n + 1):
+                scores[n - 1, i] = lm.score(' '.join(tokens[i:i + n]), bos=False, eos=False)
+        return scores
+    # 与空格拼接后再切分保持一致：空白 token 不计分，含空格的 token 拆成多个词
+    words = [token.split() for token in tokens]
+    in_state = new_state(lm)
+    out_state = new_state(lm)
+    for i in range(size):
+        lm.NullContextWrite(in_state)
+        total = 0.0
+        for n in range(min(max_order, size - i)):
+            for w in words[i + n]:
+                total += lm.BaseScore(in_state, w, out_state)
+                in_state, out_state = out_state, in_state
+            scores[n, i] = total
+    return scores
+
+
+def moving_average(scores, n):
+    """
+    首尾以边界值补齐 n-1 位后取长度为 n 的滑动平均，输出长度为 len(scores) + n - 1
+    :param scores: np.array
+    :param n: 窗口大小
+    :return: np.array
+    """
+    padded = np.pad(np.asarray(scores, dtype=float), (n - 1, n - 1), mode='edge')
+    return np.convolve(padded, np.ones(n) / n, mode='valid')
+
+
+def ngram_avg_scores(lm, tokens, orders):
+    """
+    各阶 n-gram 得分滑动平均后拼接
+    :param lm: 语言模型
+    :param tokens: 词或字列表
+    :param orders: 阶数列表，如 [1, 2, 3]
+    :return: np.array, shape (有效阶数, len(tokens))
+    """
+    table = window_scores(lm, tokens, max(orders))
+    result = []
+    for n in orders:
+        if len(tokens) < n:
+            continue
+        scores = table[n - 1, :len(tokens) - n + 1]
+        result.append(moving_average(scores, n))
+    return np.array(result)
+
+
+class ContextScorer(object):
+    """
+        固定左右上下文，只对中间替换片段影响到的 n-gram 窗口计分，
+        结果与 lm.perplexity(' '.join(before + item + after)) 一致。
+        左侧上下文状态只计算一次，供全部候选复用；
+        按 kenlm 的方式以 float32 顺序累加，保证同分候选的排序不变。
+    """
+
+    def __init__(self, lm, before_sent, after_sent):
+        self.lm = lm
+        before = ' '.join(before_sent).split()
+        after = ' '.join(after_sent).split()
+        self._n_context = len(before) + len(after)
+        self._states = (new_state(lm), new_state(lm))
+        # 左侧：<s> + 前半句
+        state = new_state(lm)
+        lm.BeginSentenceWrite(state)
+        score = np.float32(0.0)
+        for i, w in enumerate(before):
+            out_state = self._states[i % 2]
+            score += np.float32(lm.BaseScore(state, w, out_state))
+            state = out_state
+        # 左侧状态会被全部候选复用，不能与临时状态共用对象
+        self._left_state = copy.copy(state)
+        self._left_score = score
+        # 替换片段之后 order-1 个词的上下文会变化，需要随候选一起计分；其后的部分与候选无关
+        window = lm.order - 1
+        self._window_after = after[:window]
+        self._rest = after[window:] + ['</s>']
+        if len(after) < window:
+            self._window_after = self._window_after + ['</s>']
+            self._rest = []
+        self._rest_scores = None
+        self._rest_total = 0.0
+
+    def perplexity(self, item, bound=None):
+        """
+        :param item: 替换片段
+        :param bound: 剪枝上界，困惑度下界超过该值时提前放弃（要求对数概率非正）
+        :return: 困惑度，被剪枝时返回 None
+        """
+        lm = self.lm
+        words = ' '.join(item).split() + self._window_after
+        length = self._n_context + len(words) - len(self._window_after) + 1
+        state = self._left_state
+        score = self._left_score
+        for i, w in enumerate(words):
+            out_state = self._states[i % 2]
+            score += np.float32(lm.BaseScore(state, w, out_state))
+            state = out_state
+            if bound is not None and self._rest_scores is not None and \
+                    10.0 ** (-(float(score) + self._rest_total) / length) > bound * (1 + 1e-4):
+                return None
+        if self._rest_scores is None:
+            # 窗口之后的状态与候选无关，右侧各词得分只算一次
+            self._rest_scores = []
+            for i, w in enumerate(self._rest, len(words)):
+                out_state = self._states[i % 2]
+                self._rest_scores.append(np.float32(lm.BaseScore(state, w, out_state)))
+                state = out_state
+            self._rest_total = float(sum(self._rest_scores))
+        for x in self._rest_scores:
+            score += x
+        return 10.0 ** (-float(score) / length)
@@ -0,0 +1,127 @@
+#!usr/bin/env python
+#-*- coding:utf-8 -*-
+
+import gc
+import itertools
+from collections import deque
+import multiprocessing
+import os
+
+from .utils.logger import logger
+
+# 工作进程通过 fork 继承的纠错器，键为进程池编号
+_correctors = {}
+_pool_ids = itertools.count()
+
+
+def _correct_one(corrector, text, kwargs):
+    try:
+        text_new, details = corrector.correct(text, **kwargs)
+        return text_new, details, None
+    except Exception as e:
+        return text, [], '%s: %s' % (type(e).__name__, e)
+
+
+def _correct_chunk(args):
+    pool_id, texts, kwargs = args
+    corrector = _correctors[pool_id]
+    return [_correct_one(corrector, text, kwargs) for text in texts]
+
+
+def _chunks(texts, chunksize):
+    chunk = []
+    for text in texts:
+        chunk.append(text)
+        if len(chunk) >= chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class CorrectorPool(object):
+    """
+        多进程纠错池。在模型与词典加载完成后 fork 工作进程，各进程以写时复制方式共享同一份内存，
+        kenlm 二进制模型通过 mmap 加载，物理页也只有一份。
+    """
+
+    def __init__(self, corrector, workers=None):
+        """
+        :param corrector: 已加载的 Corrector
+        :param workers: 进程数，默认 CPU 核数；1 或不支持 fork 的平台在当前进程内执行
+        """
+        self.corrector = corrector
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+        self._pool_id = None
+        # 分词器词典提前加载：多进程时在 fork 前完成，避免每个工作进程各自初始化
+        initialize = getattr(corrector.tokenizer, 'initialize', None)
+        if initialize is not None:
+            initialize()
+        if self.workers > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+            logger.warning('fork is not supported on this platform, correcting in the current process')
+            self.workers = 1
+        if self.workers > 1:
+            self._start()
+
+    def _start(self):
+        self._pool_id = next(_pool_ids)
+        _correctors[self._pool_id] = self.corrector
+        # 已加载对象移出 GC 跟踪，避免子进程中的垃圾回收触碰这些页引发复制
+        gc.collect()
+        gc.freeze()
+        self._pool = multiprocessing.get_context('fork').Pool(self.workers)
+
+    def _chunksize(self, n, chunksize):
+        if chunksize:
+            return chunksize
+        return max(1, min(256, n // (self.workers * 4) if n else 1))
+
+    def imap(self, texts, chunksize=None, max_pending=None, **kwargs):
+        """
+        按输入顺序逐条返回结果。输入可为任意可迭代对象，按需读取，
+        同时在途的任务不超过 max_pending 个，内存占用与输入总量无关
+        :param texts: 文本序列
+        :param chunksize: 每个任务包含的文本数
+        :param max_pending: 同时在途的任务数，默认为进程数的 2 倍
+        :param kwargs: 传给 Corrector.correct 的检测开关
+        :return: generator of (corrected_text, details, error)
+        """
+        if self._pool is None:
+            for text in texts:
+                yield _correct_one(self.corrector, text, kwargs)
+            return
+        chunksize = chunksize or 64
+        max_pending = max_pending or self.workers * 2
+        pending = deque()
+        for chunk in _chunks(texts, chunksize):
+            pending.append(self._pool.apply_async(_correct_chunk, ((self._pool_id, chunk, kwargs),)))
+            if len(pending) >= max_pending:
+                for result in pending.popleft().get():
+                    yield result
+        while pending:
+            for result in pending.popleft().get():
+                yield result
+
+    def map(self, texts, chunksize=None, **kwargs):
+        """
+        :param texts: 文本列表
+        :return: list of (corrected_text, details, error)，与输入顺序一致
+        """
+        texts = list(texts)
+        return list(self.imap(texts, self._chunksize(len(texts), chunksize), **kwargs))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+            _correctors.pop(self._pool_id, None)
+            if not _correctors:
+                gc.unfreeze()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
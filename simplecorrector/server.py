@@ -0,0 +1,311 @@
+#!usr/bin/env python
+#-*- coding:utf-8 -*-
+"""
+本地纠错服务：asyncio HTTP/JSON，并发请求合并为小批次后交给持有模型的工作进程池。
+
+    python -m simplecorrector.server --lm_model_path lm.bin --word_dict_path word_freq.txt --port 8866
+
+    POST /correct  {"text": "..."} 或 {"texts": ["...", ...]}，可附带 "is_ngram": false 等检测开关
+    GET  /metrics  延迟、批大小直方图与计数
+    GET  /health
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import Corrector
+from .pool import CorrectorPool
+from .utils.cli import add_corrector_arguments
+from .utils.logger import logger
+from .utils.metrics import Histogram, exponential_bounds
+
+DETECTOR_FLAGS = ('is_confusion', 'is_token', 'is_wordgram', 'is_ngram')
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable',
+           504: 'Gateway Timeout'}
+
+
+class Overloaded(Exception):
+    """请求队列已满"""
+
+
+class _Item(object):
+    __slots__ = ('text', 'flags', 'future')
+
+    def __init__(self, text, flags, future):
+        self.text = text
+        self.flags = flags
+        self.future = future
+
+
+class CorrectionServer(object):
+    """
+        把并发请求按数量上限与等待时间合并为小批次，交给工作进程池纠错。
+        队列满时立即拒绝（503），单条请求超时返回 504；文本数超过 max_queue 的批次永远无法入队，直接返回 413。
+    """
+
+    def __init__(self, corrector, host='127.0.0.1', port=8866, workers=1, max_batch_size=32,
+                 max_wait=0.005, max_queue=1024, timeout=10.0):
+        """
+        :param corrector: 已加载的 Corrector
+        :param workers: 工作进程数，同时也是并行处理的批次数；1 表示在服务进程内纠错
+        :param max_batch_size: 每批最多文本数
+        :param max_wait: 凑批最长等待时间（秒）
+        :param max_queue: 排队文本数上限，超过后拒绝新请求
+        :param timeout: 单条请求超时（秒）
+        """
+        self.corrector = corrector
+        self.host = host
+        self.port = port
+        self.workers = max(1, workers)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.timeout = timeout
+        # 必须在事件循环与线程启动前 fork
+        self._pool = CorrectorPool(corrector, self.workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._queue = None
+        self._slots = None
+        self._server = None
+        self._batcher = None
+        self.latency = Histogram(exponential_bounds(1, 2, 16))
+        self.batch_sizes = Histogram(exponential_bounds(1, 2, 10))
+        self.counters = {'requests': 0, 'texts': 0, 'rejected': 0, 'timeouts': 0, 'errors': 0}
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._slots = asyncio.Semaphore(self.workers)
+        self._batcher = asyncio.get_running_loop().create_task(self._batch_loop())
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info('correction server listening on %s:%d' % (self.host, self.port))
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._batcher is not None:
+            self._batcher.cancel()
+        self._executor.shutdown(wait=True)
+        self._pool.close()
+
+    def run(self):
+        try:
+            asyncio.run(self.serve_forever())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._executor.shutdown(wait=False)
+            self._pool.close()
+
+    def metrics(self):
+        result = dict(self.counters)
+        result['queue_depth'] = self._queue.qsize() if self._queue is not None else 0
+        result['latency_ms'] = self.latency.to_dict()
+        result['batch_size'] = self.batch_sizes.to_dict()
+        result['block_cache'] = self.corrector.block_cache.stats()
+        tokenizer_cache = getattr(self.corrector.tokenizer, 'cache', None)
+        if tokenizer_cache is not None:
+            result['tokenizer_cache'] = tokenizer_cache.stats()
+        if self.corrector.tiers is not None:
+            result['tiers'] = self.corrector.tiers.counts()
+        # 服务进程内纠错（workers=1）且开启统计时，附带各阶段耗时
+        result['stages'] = self.corrector.get_stats()
+        return result
+
+    # ---------------- 批处理 ----------------
+
+    async def correct(self, texts, **flags):
+        """
+        排队纠错一组文本
+        :param texts: list of str
+        :param flags: 检测开关
+        :return: list of (corrected_text, details, error)
+        """
+        loop = asyncio.get_running_loop()
+        key = tuple(flags.get(name, True) for name in DETECTOR_FLAGS)
+        items = [_Item(text, key, loop.create_future()) for text in texts]
+        if self._queue.qsize() + len(items) > self.max_queue:
+            raise Overloaded()
+        for item in items:
+            self._queue.put_nowait(item)
+        try:
+            return await asyncio.wait_for(asyncio.gather(*[item.future for item in items]), self.timeout)
+        finally:
+            # 超时后仍在排队的文本不再处理
+            for item in items:
+                if not item.future.done():
+                    item.future.cancel()
+
+    def _drain(self, batch):
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            self._drain(batch)
+            if len(batch) < self.max_batch_size and self.max_wait > 0:
+                await asyncio.sleep(self.max_wait)
+                self._drain(batch)
+            batch = [item for item in batch if not item.future.done()]
+            if not batch:
+                continue
+            await self._slots.acquire()
+            loop.create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch):
+        loop = asyncio.get_running_loop()
+        self.batch_sizes.observe(len(batch))
+        groups = {}
+        for item in batch:
+            groups.setdefault(item.flags, []).append(item)
+        try:
+            for key, items in groups.items():
+                flags = dict(zip(DETECTOR_FLAGS, key))
+                texts = [item.text for item in items]
+                results = await loop.run_in_executor(self._executor, lambda: self._pool.map(texts, **flags))
+                for item, result in zip(items, results):
+                    if not item.future.done():
+                        item.future.set_result(result)
+        except Exception as e:
+            logger.warning('batch failed: %s' % e)
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    # ---------------- HTTP ----------------
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        parts = line.decode('latin-1').split()
+        if len(parts) < 2:
+            raise ValueError('bad request line')
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0))
+        if length > MAX_BODY_BYTES:
+            return parts[0], parts[1], headers, None
+        body = await reader.readexactly(length) if length else b''
+        return parts[0], parts[1], headers, body
+
+    def _write_response(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        head = ['HTTP/1.1 %d %s' % (status, REASONS.get(status, '')),
+                'Content-Type: application/json; charset=utf-8',
+                'Content-Length: %d' % len(body),
+                'Connection: %s' % ('keep-alive' if keep_alive else 'close')]
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except ValueError:
+                    self._write_response(writer, 400, {'error': 'bad request'}, False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close' and body is not None
+                status, payload = await self._route(method, path.split('?')[0], body)
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, body):
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        if path == '/metrics':
+            return 200, self.metrics()
+        if path != '/correct':
+            return 404, {'error': 'not found'}
+        if method != 'POST':
+            return 405, {'error': 'use POST'}
+        if body is None:
+            return 413, {'error': 'request body too large'}
+        start = time.time()
+        self.counters['requests'] += 1
+        try:
+            request = json.loads(body.decode('utf-8'))
+            single = 'text' in request
+            texts = [request['text']] if single else list(request['texts'])
+            flags = dict((name, bool(request[name])) for name in DETECTOR_FLAGS if name in request)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return 400, {'error': 'expected JSON body with "text" or "texts"'}
+        if len(texts) > self.max_queue:
+            # 重试也无法成功，不能按 503 过载处理
+            return 413, {'error': 'batch of %d texts exceeds max_queue %d' % (len(texts), self.max_queue)}
+        try:
+            results = await self.correct(texts, **flags)
+        except Overloaded:
+            self.counters['rejected'] += 1
+            return 503, {'error': 'server overloaded'}
+        except asyncio.TimeoutError:
+            self.counters['timeouts'] += 1
+            return 504, {'error': 'timeout'}
+        except Exception as e:
+            self.counters['errors'] += 1
+            return 500, {'error': str(e)}
+        # 只统计实际完成纠错的文本，被拒绝或超时的不计入
+        self.counters['texts'] += len(texts)
+        latency = (time.time() - start) * 1000
+        self.latency.observe(latency)
+        results = [{'text': text, 'details': details, 'error': error} for text, details, error in results]
+        if single:
+            payload = results[0]
+        else:
+            payload = {'results': results}
+        payload['latency_ms'] = latency
+        return 200, payload
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='simplecorrector 本地纠错服务')
+    add_corrector_arguments(parser)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8866)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--max_batch_size', type=int, default=32)
+    parser.add_argument('--max_wait_ms', type=float, default=5.0)
+    parser.add_argument('--max_queue', type=int, default=1024)
+    parser.add_argument('--timeout', type=float, default=10.0)
+    args = parser.parse_args(argv)
+    server = CorrectionServer(Corrector(args), host=args.host, port=args.port, workers=args.workers,
+                              max_batch_size=args.max_batch_size, max_wait=args.max_wait_ms / 1000.0,
+                              max_queue=args.max_queue, timeout=args.timeout)
+    server.run()
+
+
+if __name__ == '__main__':
+    main()
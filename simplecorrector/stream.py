@@ -0,0 +1,156 @@
+#!usr/bin/env python
+#-*- coding:utf-8 -*-
+"""
+大文件流式纠错，支持断点续跑。
+
+    python -m simplecorrector.stream corpus.jsonl corrected.jsonl --format jsonl --field text \\
+        --checkpoint corrected.ckpt --workers 8 --lm_model_path lm.bin --word_dict_path word_freq.txt
+
+text 格式逐行输出纠正后的文本；jsonl 格式在每条记录中加入 corrected、details 字段（出错时另加 error）。
+检查点记录已写出结果对应的输入与输出字节位置，任务中断后以相同参数重跑即从该位置继续。
+"""
+
+import argparse
+import json
+import os
+from collections import deque
+
+from . import Corrector
+from .utils.cli import add_corrector_arguments, add_detector_arguments, detector_flags
+from .utils.logger import logger
+
+
+def read_records(path, fmt='text', field='text', offset=0):
+    """
+    逐行读取输入文件
+    :param path: UTF-8 文本或 JSONL 文件
+    :param fmt: 'text' 或 'jsonl'
+    :param field: jsonl 中待纠错文本所在字段
+    :param offset: 起始字节位置
+    :return: generator of (该行结束后的字节位置, 文本, 记录)，jsonl 行解析失败时文本为 None
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            offset += len(line)
+            line = line.decode('utf-8', 'replace').rstrip('\r\n')
+            if fmt == 'jsonl':
+                try:
+                    record = json.loads(line)
+                    text = record.get(field)
+                except (ValueError, AttributeError):
+                    record, text = {'line': line}, None
+            else:
+                record, text = None, line
+            yield offset, text, record
+
+
+def load_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, state):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def format_result(fmt, text, record, result):
+    corrected, details, error = result
+    if fmt != 'jsonl':
+        return (corrected if corrected is not None else text) + '\n'
+    record = dict(record)
+    if text is None and error is None:
+        error = 'invalid record'
+    record['corrected'] = corrected
+    record['details'] = details
+    if error is not None:
+        record['error'] = error
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def correct_file(corrector, input_path, output_path, fmt='text', field='text', checkpoint_path=None,
+                 checkpoint_every=1000, workers=1, chunksize=64, **kwargs):
+    """
+    流式纠错一个文件，结果按输入顺序写出
+    :param corrector: Corrector
+    :param checkpoint_path: 检查点文件，存在时从记录的位置继续
+    :param checkpoint_every: 每写出多少条记录更新一次检查点
+    :param kwargs: 传给 correct 的检测开关
+    :return: int, 本次处理的记录数
+    """
+    state = load_checkpoint(checkpoint_path)
+    if state is not None and state.get('input') != os.path.abspath(input_path):
+        raise ValueError('checkpoint %s belongs to another input: %s' % (checkpoint_path, state.get('input')))
+    if state is not None:
+        output_size = os.path.getsize(output_path) if os.path.exists(output_path) else -1
+        if output_size < state.get('output_offset', 0):
+            # 输出缺失或短于检查点，已写出的结果不可信，丢弃检查点从头开始
+            logger.warning('output %s is missing or shorter than checkpoint, restarting from the beginning'
+                           % output_path)
+            state = None
+    if state is None:
+        state = {'input': os.path.abspath(input_path), 'offset': 0, 'output_offset': 0, 'records': 0}
+        mode = 'wb'
+    else:
+        logger.info('resuming from record %d, byte %d' % (state['records'], state['offset']))
+        mode = 'r+b'
+
+    # 读出但尚未写出的记录，长度受进程池在途任务数限制
+    pending = deque()
+
+    def texts():
+        for offset, text, record in read_records(input_path, fmt, field, state['offset']):
+            pending.append((offset, text, record))
+            yield text
+
+    count = 0
+    with open(output_path, mode) as out:
+        # 丢弃上次检查点之后写出的不完整结果
+        out.seek(state['output_offset'])
+        out.truncate()
+        for result in corrector.correct_stream(texts(), workers=workers, chunksize=chunksize, **kwargs):
+            offset, text, record = pending.popleft()
+            out.write(format_result(fmt, text, record, result).encode('utf-8'))
+            count += 1
+            state['offset'] = offset
+            state['records'] += 1
+            if checkpoint_path and count % checkpoint_every == 0:
+                out.flush()
+                os.fsync(out.fileno())
+                state['output_offset'] = out.tell()
+                save_checkpoint(checkpoint_path, state)
+        out.flush()
+        state['output_offset'] = out.tell()
+    if checkpoint_path:
+        state['done'] = True
+        save_checkpoint(checkpoint_path, state)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='simplecorrector 流式文件纠错')
+    parser.add_argument('input', help='UTF-8 文本或 JSONL 文件')
+    parser.add_argument('output')
+    parser.add_argument('--format', default='text', choices=['text', 'jsonl'])
+    parser.add_argument('--field', default='text', help='jsonl 中待纠错文本所在字段')
+    parser.add_argument('--checkpoint', default=None, help='检查点文件，中断后以相同参数重跑即可续跑')
+    parser.add_argument('--checkpoint_every', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--chunksize', type=int, default=64)
+    add_corrector_arguments(parser)
+    add_detector_arguments(parser)
+    args = parser.parse_args(argv)
+    corrector = Corrector(args)
+    count = correct_file(corrector, args.input, args.output, fmt=args.format, field=args.field,
+                         checkpoint_path=args.checkpoint, checkpoint_every=args.checkpoint_every,
+                         workers=args.workers, chunksize=args.chunksize, **detector_flags(args))
+    logger.info('corrected %d records' % count)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,90 @@
 #!usr/bin/env python
-#-*- coding:utf-8 -*-
\ No newline at end of file
+#-*- coding:utf-8 -*-
+
+from collections import namedtuple
+
+from ..utils.lru import LRUCache
+
+# precise: 精确模式的 (词, 起点, 终点)；search: 搜索模式，词内的高频二字、三字词在整词之前
+Segmentation = namedtuple('Segmentation', ['precise', 'search'])
+
+
+class Tokenizer(object):
+    """
+        分词组件：一次切分同时给出精确模式与搜索模式的带位置结果，并缓存最近的切分。
+        各检测器共享同一结果，同一短句只切分一次。
+    """
+
+    def __init__(self, dt=None, cache_bytes=4 * 1024 * 1024, hmm=True):
+        """
+        :param dt: jieba.Tokenizer，默认使用 jieba 的全局分词器（jieba.add_word 等修改对其生效）
+        :param cache_bytes: 切分结果缓存的内存预算（字节），0 表示只保留最近一句
+        :param hmm: 是否用 HMM 识别未登录词
+        """
+        if dt is None:
+            import jieba
+            dt = jieba.dt
+        self.dt = dt
+        self.hmm = hmm
+        self.cache = LRUCache(cache_bytes)
+        self._last = None
+
+    def initialize(self):
+        self.dt.initialize()
+
+    def clear(self):
+        """分词词典变化后清空缓存"""
+        self.cache.clear()
+        self._last = None
+
+    def segment(self, sentence):
+        """
+        :param sentence: str
+        :return: Segmentation
+        """
+        last = self._last
+        if last is not None and last[0] == sentence:
+            return last[1]
+        result = self.cache.get(sentence)
+        if result is None:
+            result = self._segment(sentence)
+            if self.cache.max_bytes:
+                self.cache.put(sentence, result)
+        self._last = (sentence, result)
+        return result
+
+    def _segment(self, sentence):
+        # 搜索模式与 jieba.tokenize(mode='search') 相同，由精确模式的结果展开，不再重新切分
+        freq = self.dt.FREQ
+        precise = []
+        search = []
+        start = 0
+        for w in self.dt.cut(sentence, HMM=self.hmm):
+            width = len(w)
+            if width > 2:
+                for i in range(width - 1):
+                    if freq.get(w[i:i + 2]):
+                        search.append((w[i:i + 2], start + i, start + i + 2))
+            if width > 3:
+                for i in range(width - 2):
+                    if freq.get(w[i:i + 3]):
+                        search.append((w[i:i + 3], start + i, start + i + 3))
+            token = (w, start, start + width)
+            search.append(token)
+            precise.append(token)
+            start += width
+        return Segmentation(tuple(precise), tuple(search))
+
+    def cut(self, sentence):
+        """
+        :return: list of str, 精确模式的词
+        """
+        return [w for w, _, _ in self.segment(sentence).precise]
+
+    def tokenize(self, sentence, mode='default'):
+        """
+        :param mode: 'default' 或 'search'
+        :return: list of (词, 起点, 终点)
+        """
+        segmentation = self.segment(sentence)
+        return list(segmentation.search if mode == 'search' else segmentation.precise)
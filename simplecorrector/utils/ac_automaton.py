@@ -0,0 +1,146 @@
+#!usr/bin/env python
+#-*- coding:utf-8 -*-
+
+from collections import deque
+
+
+class AhoCorasick(object):
+    """
+        多模式匹配自动机（Aho-Corasick），用于混淆词典检索。
+        一次线性扫描即可找出文本中全部（包括相互重叠的）词典词。
+    """
+
+    def __init__(self, words=None):
+        # 每个节点：转移表、失败指针、词长（0表示非词尾）、输出指针（最近的词尾后缀节点）
+        self._goto = [{}]
+        self._fail = [0]
+        self._word_len = [0]
+        self._out = [0]
+        self._dirty = False
+        self._size = 0
+        if words:
+            self.update(words)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, word):
+        node = 0
+        for c in word:
+            node = self._goto[node].get(c)
+            if node is None:
+                return False
+        return self._word_len[node] > 0
+
+    def add(self, word):
+        """
+        加入一个模式串，失败指针在下一次匹配前重建
+        :param word: str
+        """
+        if not word:
+            return
+        node = 0
+        for c in word:
+            nxt = self._goto[node].get(c)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][c] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._word_len.append(0)
+                self._out.append(0)
+            node = nxt
+        if not self._word_len[node]:
+            self._word_len[node] = len(word)
+            self._size += 1
+            self._dirty = True
+
+    def update(self, words):
+        for word in words:
+            self.add(word)
+
+    def _build(self):
+        """广度优先重建失败指针与输出指针"""
+        queue = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            self._out[child] = 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for c, child in self._goto[node].items():
+                f = self._fail[node]
+                while f and c not in self._goto[f]:
+                    f = self._fail[f]
+                f = self._goto[f].get(c, 0)
+                self._fail[child] = f
+                self._out[child] = f if self._word_len[f] else self._out[f]
+                queue.append(child)
+        self._dirty = False
+
+    def iter(self, text):
+        """
+        按结束位置顺序返回全部命中
+        :param text: str
+        :return: generator of (begin_idx, end_idx, word)
+        """
+        if self._dirty:
+            self._build()
+        goto = self._goto
+        fail = self._fail
+        word_len = self._word_len
+        out = self._out
+        node = 0
+        for i, c in enumerate(text):
+            while node and c not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(c, 0)
+            hit = node if word_len[node] else out[node]
+            while hit:
+                end = i + 1
+                begin = end - word_len[hit]
+                yield begin, end, text[begin:end]
+                hit = out[hit]
+
+    def findall(self, text):
+        """
+        全部命中，按起始位置升序、同起点长词在前排列
+        :param text: str
+        :return: list of (begin_idx, end_idx, word)
+        """
+        return sorted(self.iter(text), key=lambda x: (x[0], -x[1]))
+
+
+class OverlayMatcher(object):
+    """
+        共享的基础自动机之上叠加实例私有的自动机，新增词只进入私有部分，基础自动机保持只读
+    """
+
+    def __init__(self, base):
+        """
+        :param base: AhoCorasick，可被多个实例共享
+        """
+        self.base = base
+        self.overlay = AhoCorasick()
+
+    def __len__(self):
+        return len(self.base) + len(self.overlay)
+
+    def __contains__(self, word):
+        return word in self.overlay or word in self.base
+
+    def add(self, word):
+        self.overlay.add(word)
+
+    def update(self, words):
+        self.overlay.update(words)
+
+    def findall(self, text):
+        """
+        :return: list of (begin_idx, end_idx, word)，两部分的命中去重后按起点升序、同起点长词在前排列
+        """
+        if not len(self.overlay):
+            return self.base.findall(text)
+        hits = set(self.base.iter(text))
+        hits.update(self.overlay.iter(text))
+        return sorted(hits, key=lambda x: (x[0], -x[1]))
@@ -0,0 +1,104 @@
+#!usr/bin/env python
+#-*- coding:utf-8 -*-
+
+import gc
+import hashlib
+import os
+import pickle
+
+from .logger import logger
+
+
+def file_signature(paths):
+    """
+    源文件签名：解析软链接后的真实路径、大小、修改时间，文件不存在时记为 None
+    :param paths: list of str
+    :return: list
+    """
+    result = []
+    for path in paths:
+        if path and os.path.exists(path):
+            stat = os.stat(path)
+            result.append((os.path.realpath(path), stat.st_size, stat.st_mtime_ns))
+        else:
+            result.append((path, None, None))
+    return result
+
+
+def default_cache_dir():
+    """
+    :return: str, 用户缓存目录，$XDG_CACHE_HOME/simplecorrector，默认 ~/.cache/simplecorrector
+    """
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'simplecorrector')
+
+
+def cache_path_for(cache_dir, source_path, suffix):
+    """
+    派生缓存的路径，放在缓存目录下而不是源文件旁，文件名含源文件真实路径的哈希，同名词典互不覆盖
+    :param cache_dir: 缓存目录，为空时不缓存
+    :param source_path: 源文件路径
+    :param suffix: 文件名后缀，如 '.index.pickle'
+    :return: str 或 None
+    """
+    if not cache_dir or not source_path or not os.path.exists(source_path):
+        return None
+    real_path = os.path.realpath(source_path)
+    digest = hashlib.sha1(real_path.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, '%s.%s%s' % (os.path.basename(real_path), digest, suffix))
+
+
+def load_cache(cache_path, source_paths, version, expected_type=None):
+    """
+    读取由源文件派生的缓存，版本不符、源文件有变化或内容类型不符时返回 None
+    :param cache_path: 缓存文件路径
+    :param source_paths: 源文件路径列表
+    :param version: 缓存格式版本
+    :param expected_type: 缓存数据应有的类型，不符时视为无效
+    :return: 缓存数据或 None
+    """
+    if not cache_path or not os.path.exists(cache_path):
+        return None
+    # 反序列化大量容器对象时关闭 GC，避免反复触发分代回收
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with open(cache_path, 'rb') as handle:
+            header = pickle.load(handle)
+            if header != (version, file_signature(source_paths)):
+                return None
+            data = pickle.load(handle)
+        if expected_type is not None and not isinstance(data, expected_type):
+            logger.warning('cache %s holds %s instead of %s, rebuilding'
+                           % (cache_path, type(data).__name__, expected_type.__name__))
+            return None
+        return data
+    except Exception as e:
+        logger.warning('failed to load cache %s: %s' % (cache_path, e))
+        return None
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def dump_cache(cache_path, source_paths, version, data):
+    """
+    写入缓存，先写临时文件再替换，目录不可写时只记录警告
+    :param cache_path: 缓存文件路径
+    :param source_paths: 源文件路径列表
+    :param version: 缓存格式版本
+    :param data: 可 pickle 的数据
+    """
+    if not cache_path:
+        return
+    tmp_path = '%s.%d.tmp' % (cache_path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, 'wb') as handle:
+            pickle.dump((version, file_signature(source_paths)), handle, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(data, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except (IOError, OSError) as e:
+        logger.warning('failed to write cache %s: %s' % (cache_path, e))
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
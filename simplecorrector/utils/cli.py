@@ -0,0 +1,50 @@
+#!usr/bin/env python
+#-*- coding:utf-8 -*-
+
+import os
+
+data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+def add_corrector_arguments(parser, lm_model_path=None, word_dict_path=''):
+    """
+    命令行加入 Corrector 配置项，解析结果可直接作为 config 传给 Corrector
+    :param parser: argparse.ArgumentParser
+    :param lm_model_path: 语言模型默认路径，None 时为必填项
+    :param word_dict_path: 词频词典默认路径
+    """
+    group = parser.add_argument_group('corrector')
+    group.add_argument('--lm_model_path', required=lm_model_path is None, default=lm_model_path, help='kenlm 或 NLM 语言模型')
+    group.add_argument('--word_dict_path', default=word_dict_path, help='词频词典')
+    group.add_argument('--pinyin2word_path', default='', help='拼音-词文件')
+    group.add_argument('--confusion_path', default=os.path.join(data_dir, 'custom_confusion.txt'))
+    group.add_argument('--same_pinyin_path', default=os.path.join(data_dir, 'same_pinyin.txt'))
+    group.add_argument('--same_stroke_path', default=os.path.join(data_dir, 'same_stroke.txt'))
+    group.add_argument('--char_set_path', default=os.path.join(data_dir, 'common_char_set.txt'))
+    group.add_argument('--snapshot_path', default=None, help='词典编译快照')
+    group.add_argument('--cache_dir', default=None, help='派生缓存目录，默认 ~/.cache/simplecorrector')
+    group.add_argument('--no_cache', dest='use_cache', action='store_false', help='不读写派生缓存')
+    group.add_argument('--edit_distance', type=int, default=1)
+    group.add_argument('--block_cache_bytes', type=int, default=32 * 1024 * 1024)
+    group.add_argument('--tokenizer_cache_bytes', type=int, default=4 * 1024 * 1024)
+    group.add_argument('--tier_thresholds_path', default=None, help='分层检测阈值，见 simplecorrector.calibrate')
+    group.add_argument('--candidate_top_k', type=int, default=None, help='语言模型计分前只保留的候选数，默认不限')
+    group.add_argument('--candidate_filter', default='bigram', choices=('freq', 'unigram', 'bigram'),
+                       help='候选预筛的排序依据')
+    return group
+
+
+def add_detector_arguments(parser):
+    """命令行加入检测开关，--no_ngram 等关闭对应检测"""
+    group = parser.add_argument_group('detectors')
+    for name in ('confusion', 'token', 'wordgram', 'ngram'):
+        group.add_argument('--no_%s' % name, action='store_true', help='关闭 is_%s 检测' % name)
+    return group
+
+
+def detector_flags(args):
+    """
+    :return: dict, 传给 Corrector.correct 的检测开关
+    """
+    return dict(('is_%s' % name, not getattr(args, 'no_%s' % name))
+                for name in ('confusion', 'token', 'wordgram', 'ngram'))
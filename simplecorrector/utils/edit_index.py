@@ -0,0 +1,123 @@
+#!usr/bin/env python
+#-*- coding:utf-8 -*-
+
+from itertools import combinations
+
+import numpy as np
+
+from .string_table import StringTable
+
+WILDCARD = '\x00'
+
+
+class EditIndex(object):
+    """
+        删除邻域索引（SymSpell 思路）：词典中每个词把任意 1..max_distance 个位置替换为通配符后作为键，
+        查询时对输入词做同样变换，命中的桶即为替换距离内的全部已知词，无需枚举整个字表。
+    """
+
+    def __init__(self, words=(), max_distance=1):
+        self.max_distance = max_distance
+        self._words = set()
+        self._index = {}
+        for word in words:
+            self.add(word)
+
+    def __len__(self):
+        return len(self._words)
+
+    def __contains__(self, word):
+        return word in self._words
+
+    @staticmethod
+    def _keys(word, distance):
+        chars = list(word)
+        for positions in combinations(range(len(word)), distance):
+            masked = chars[:]
+            for i in positions:
+                masked[i] = WILDCARD
+            yield positions, ''.join(masked)
+
+    def add(self, word):
+        if word in self._words:
+            return
+        self._words.add(word)
+        for distance in range(1, min(self.max_distance, len(word)) + 1):
+            for _, key in self._keys(word, distance):
+                self._index.setdefault(key, []).append(word)
+
+    def _bucket(self, key):
+        return self._index.get(key, ())
+
+    def to_arrays(self, word_table):
+        """
+        导出为数组：键表 + 倒排（CSR），词以 word_table 中的编号保存
+        :param word_table: StringTable，须包含全部索引词
+        :return: dict of np.ndarray
+        """
+        keys = StringTable.build(self._index)
+        word_ids = dict((w, i) for i, w in enumerate(word_table))
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        postings = []
+        for i, key in enumerate(keys):
+            postings.extend(word_ids[w] for w in self._index[key])
+            offsets[i + 1] = len(postings)
+        arrays = keys.to_arrays('keys.')
+        arrays.update({'postings.offsets': offsets, 'postings': np.array(postings, dtype=np.int32),
+                       'max_distance': np.array([self.max_distance], dtype=np.int32)})
+        return arrays
+
+    def lookup(self, word, distance=1, char_set=None):
+        """
+        取替换距离 distance 以内或相邻字互换得到的全部已知词，与 known(edits1(word)) 的结果一致
+        :param word: 输入词
+        :param distance: 替换距离，不超过 max_distance
+        :param char_set: 替换字须在该字表中，None 表示不限制
+        :return: set
+        """
+        distance = min(distance, self.max_distance, len(word))
+        result = set()
+        for d in range(1, distance + 1):
+            for positions, key in self._keys(word, d):
+                for w in self._bucket(key):
+                    if char_set is None or all(w[i] in char_set for i in positions):
+                        result.add(w)
+        # 相邻字互换
+        for i in range(len(word) - 1):
+            w = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+            if w in self:
+                result.add(w)
+        return result
+
+
+class FrozenEditIndex(EditIndex):
+    """
+        建立在 mmap 数组上的只读删除邻域索引，由 EditIndex.to_arrays 导出的数组构造
+    """
+
+    def __init__(self, word_table, arrays):
+        self.max_distance = int(arrays['max_distance'][0])
+        self._word_table = word_table
+        self._key_table = StringTable.from_arrays(arrays, 'keys.')
+        self._post_offsets = memoryview(arrays['postings.offsets']).cast('B').cast('q')
+        self._postings = arrays['postings']
+        self._arrays = arrays
+
+    def __len__(self):
+        return len(self._word_table)
+
+    def to_arrays(self, word_table):
+        return self._arrays
+
+    def __contains__(self, word):
+        return word in self._word_table
+
+    def add(self, word):
+        raise TypeError('FrozenEditIndex is read-only')
+
+    def _bucket(self, key):
+        i = self._key_table.index(key)
+        if i < 0:
+            return ()
+        ids = self._postings[self._post_offsets[i]:self._post_offsets[i + 1]]
+        return [self._word_table[j] for j in ids.tolist()]
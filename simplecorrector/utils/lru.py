@@ -0,0 +1,74 @@
+#!usr/bin/env python
+#-*- coding:utf-8 -*-
+
+import sys
+from collections import OrderedDict
+
+
+def estimate_size(obj):
+    """粗略估计字符串、列表、元组嵌套结构占用的字节数"""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (list, tuple)):
+        size += sum(estimate_size(x) for x in obj)
+    return size
+
+
+class LRUCache(object):
+    """
+        按内存预算淘汰的 LRU 缓存，带命中统计
+    """
+
+    def __init__(self, max_bytes):
+        """
+        :param max_bytes: 内存预算（字节），按 estimate_size 估算键与值的大小
+        """
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def put(self, key, value):
+        size = estimate_size(key) + estimate_size(value)
+        if size > self.max_bytes:
+            return
+        if key in self._data:
+            self.bytes -= self._data.pop(key)[1]
+        self._data[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, old_size) = self._data.popitem(last=False)
+            self.bytes -= old_size
+
+    def clear(self):
+        self._data.clear()
+        self.bytes = 0
+
+    def stats(self):
+        """
+        :return: dict, 命中、未命中次数、命中率、条数与占用字节
+        """
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': len(self._data),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+        }
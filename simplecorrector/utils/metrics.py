@@ -0,0 +1,72 @@
+#!usr/bin/env python
+#-*- coding:utf-8 -*-
+
+from bisect import bisect_left
+
+
+def exponential_bounds(start, factor, count):
+    """
+    指数增长的分桶上界，如 exponential_bounds(0.1, 2, 5) -> [0.1, 0.2, 0.4, 0.8, 1.6]
+    """
+    return [start * factor ** i for i in range(count)]
+
+
+class Histogram(object):
+    """
+        分桶直方图，记录次数、总和、最值，分位数按桶上界估计
+    """
+
+    def __init__(self, bounds):
+        """
+        :param bounds: 递增的分桶上界，超过最后一个上界的值计入溢出桶
+        """
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """
+        :param q: 0-1
+        :return: 第 q 分位所在桶的上界，溢出桶返回最大值
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def reset(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'buckets': [[b, c] for b, c in zip(self.bounds + ['+Inf'], self.counts)],
+        }
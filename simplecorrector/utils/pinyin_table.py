@@ -0,0 +1,126 @@
+#!usr/bin/env python
+#-*- coding:utf-8 -*-
+
+from functools import lru_cache
+
+import numpy as np
+from pypinyin import lazy_pinyin
+
+from .string_table import StringTable
+
+
+@lru_cache(maxsize=100000)
+def pinyin_key(word):
+    """
+    拼音键，与 pinyin2word 的键格式一致，如 '今天' -> 'jin,tian'
+    词典外的词（多为疑似错误词）按 LRU 缓存
+    """
+    return ','.join(lazy_pinyin(word))
+
+
+class PinyinTable(object):
+    """
+        词典词 -> 拼音键 的正向表，以及 拼音键 -> 词 的反向索引，加载时一次算好。
+        候选生成与拼音过滤都只查表，不再调用 lazy_pinyin。
+    """
+
+    def __init__(self, words=(), pinyin2word=None):
+        """
+        :param words: 词典词
+        :param pinyin2word: dict, {拼音键: {词: ''}}，作为反向索引的来源
+        """
+        self._keys = {}
+        self._words = {}
+        interned = {}
+        for word in words:
+            key = pinyin_key(word)
+            # 同音词共用同一个键对象
+            self._keys[word] = interned.setdefault(key, key)
+        for key, words in (pinyin2word or {}).items():
+            self._words[interned.setdefault(key, key)] = tuple(words)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, word):
+        return word in self._keys
+
+    def key(self, word):
+        """
+        :param word: str
+        :return: 拼音键，不在表中的词现算
+        """
+        key = self._keys.get(word)
+        if key is None:
+            key = pinyin_key(word)
+        return key
+
+    def words(self, key, default=()):
+        """
+        :param key: 拼音键
+        :return: 该读音的全部词
+        """
+        return self._words.get(key, default)
+
+    def to_arrays(self, word_table):
+        """
+        导出为数组：拼音键表、每个词典词的键编号、反向索引（CSR）
+        :param word_table: StringTable，须包含全部正向表中的词
+        :return: dict of np.ndarray
+        """
+        keys = StringTable.build(list(self._keys.values()) + list(self._words))
+        key_ids = dict((k, i) for i, k in enumerate(keys))
+        word_keys = np.full(len(word_table), -1, dtype=np.int32)
+        for i, word in enumerate(word_table):
+            if word in self._keys:
+                word_keys[i] = key_ids[self._keys[word]]
+        rev_table = StringTable.build(w for words in self._words.values() for w in words)
+        rev_ids = dict((w, i) for i, w in enumerate(rev_table))
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        postings = []
+        for i, key in enumerate(keys):
+            postings.extend(rev_ids[w] for w in self._words.get(key, ()))
+            offsets[i + 1] = len(postings)
+        arrays = keys.to_arrays('keys.')
+        arrays.update(rev_table.to_arrays('words.'))
+        arrays.update({'word_keys': word_keys, 'postings.offsets': offsets,
+                       'postings': np.array(postings, dtype=np.int32)})
+        return arrays
+
+
+class FrozenPinyinTable(PinyinTable):
+    """
+        建立在 mmap 数组上的只读拼音表，由 PinyinTable.to_arrays 导出的数组构造
+    """
+
+    def __init__(self, word_table, arrays):
+        self._word_table = word_table
+        self._key_table = StringTable.from_arrays(arrays, 'keys.')
+        self._word_keys = arrays['word_keys']
+        self._rev_table = StringTable.from_arrays(arrays, 'words.')
+        self._post_offsets = memoryview(arrays['postings.offsets']).cast('B').cast('q')
+        self._postings = arrays['postings']
+        self._arrays = arrays
+
+    def __len__(self):
+        return int((self._word_keys >= 0).sum())
+
+    def to_arrays(self, word_table):
+        return self._arrays
+
+    def __contains__(self, word):
+        i = self._word_table.index(word)
+        return i >= 0 and self._word_keys[i] >= 0
+
+    def key(self, word):
+        i = self._word_table.index(word)
+        if i >= 0 and self._word_keys[i] >= 0:
+            return self._key_table[int(self._word_keys[i])]
+        return pinyin_key(word)
+
+    def words(self, key, default=()):
+        i = self._key_table.index(key)
+        if i < 0 or self._post_offsets[i] == self._post_offsets[i + 1]:
+            return default
+        ids = self._postings[self._post_offsets[i]:self._post_offsets[i + 1]]
+        return tuple(self._rev_table[j] for j in ids.tolist())
@@ -0,0 +1,69 @@
+#!usr/bin/env python
+#-*- coding:utf-8 -*-
+
+import heapq
+
+FILTER_POLICIES = ('freq', 'unigram', 'bigram')
+
+
+class CandidateFilter(object):
+    """
+        语言模型排序前的候选预筛：用词频或低阶先验给候选打一个便宜的分，只保留前 top_k 个交给完整的语言模型计分。
+        原词不参与筛选，总会参与后续比较。
+    """
+
+    def __init__(self, lm, word_dict, top_k, policy='bigram'):
+        """
+        :param lm: 语言模型，需提供 score 方法
+        :param word_dict: 词频词典
+        :param top_k: 保留的候选数
+        :param policy: 'freq' 按词典词频；'unigram' 按各字 unigram log10 概率之和；
+                       'bigram' 连同前后各一个字一起计分，不跨出该窗口
+        """
+        if policy not in FILTER_POLICIES:
+            raise ValueError('unknown candidate filter policy %r, expected one of %s' % (policy, FILTER_POLICIES))
+        if top_k < 1:
+            raise ValueError('top_k must be positive')
+        self.lm = lm
+        self.word_dict = word_dict
+        self.top_k = top_k
+        self.policy = policy
+        # 单字 unigram 得分，字表有限，不设上限
+        self._unigram = {}
+
+    def _unigram_score(self, word):
+        cache = self._unigram
+        total = 0.0
+        for c in word:
+            score = cache.get(c)
+            if score is None:
+                score = cache[c] = self.lm.score(c, bos=False, eos=False) if not c.isspace() else 0.0
+            total += score
+        return total
+
+    def _bigram_score(self, word, before_sent, after_sent):
+        # 同一位置的候选共享前后字，只需比较窗口内的得分
+        chars = [c for c in before_sent[-1:] + word + after_sent[:1] if not c.isspace()]
+        return self.lm.score(' '.join(chars), bos=not before_sent, eos=not after_sent)
+
+    def score(self, word, before_sent='', after_sent=''):
+        """
+        :return: float, 越大越可能正确
+        """
+        if self.policy == 'freq':
+            return self.word_dict.get(word, 0)
+        if self.policy == 'unigram':
+            return self._unigram_score(word)
+        return self._bigram_score(word, before_sent, after_sent)
+
+    def select(self, cur_item, candidates, before_sent='', after_sent=''):
+        """
+        :param cur_item: 原词
+        :param candidates: 候选集合
+        :return: (保留的候选列表，不含原词，按先验降序、同分按字符串排列；被剪掉的候选数)
+        """
+        others = [c for c in candidates if c != cur_item]
+        key = lambda c: (-self.score(c, before_sent, after_sent), c)
+        if len(others) <= self.top_k:
+            return sorted(others, key=key), 0
+        return heapq.nsmallest(self.top_k, others, key=key), len(others) - self.top_k
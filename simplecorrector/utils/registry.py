@@ -0,0 +1,74 @@
+#!usr/bin/env python
+#-*- coding:utf-8 -*-
+
+import threading
+
+from .cache import file_signature
+from .logger import logger
+
+
+class ModelRegistry(object):
+    """
+        进程内共享的只读模型与词典，按 (类型, 源文件签名, 附加参数) 去重并引用计数。
+        多个 Corrector 使用相同文件时只加载一份，内存随不同文件数而非实例数增长；
+        源文件被修改后签名变化，新实例会加载新版本，旧版本在引用全部释放后丢弃。
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.RLock()
+
+    def acquire(self, kind, paths, loader, extra=()):
+        """
+        :param kind: 对象类型，如 'lm'、'word_dict'
+        :param paths: 源文件路径列表
+        :param loader: 无参函数，缓存未命中时调用；返回 None 表示加载失败，不缓存
+        :param extra: 影响加载结果的其他参数，须可哈希
+        :return: (键, 对象)，加载失败时键为 None
+        """
+        key = (kind, tuple(file_signature(paths)), extra)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                obj = loader()
+                if obj is None:
+                    return None, None
+                entry = self._entries[key] = [obj, 0]
+            else:
+                logger.debug('sharing %s: %s' % (kind, paths))
+            entry[1] += 1
+            return key, entry[0]
+
+    def release(self, key):
+        """引用计数减一，归零后丢弃"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self._entries[key]
+
+    def release_all(self, keys):
+        """
+        释放一组键并清空该列表，可重复调用；供实例关闭或被回收时使用
+        :param keys: list, acquire 返回的键
+        """
+        for key in keys:
+            self.release(key)
+        del keys[:]
+
+    def stats(self):
+        """
+        :return: list of dict, 每个共享对象的类型、源文件与引用数
+        """
+        with self._lock:
+            return [{'kind': kind, 'sources': [path for path, _, _ in signature], 'refs': refs}
+                    for (kind, signature, _), (_, refs) in self._entries.items()]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# 进程级单例
+registry = ModelRegistry()
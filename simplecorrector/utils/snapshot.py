@@ -0,0 +1,73 @@
+#!usr/bin/env python
+#-*- coding:utf-8 -*-
+
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b'SCSNAP01'
+ALIGN = 64
+
+
+def write_arrays(path, meta, arrays):
+    """
+    把一组 numpy 数组写入单个二进制文件：魔数 + 头部长度 + JSON 头部 + 按 64 字节对齐的原始数据
+    :param path: 输出路径
+    :param meta: 可 JSON 序列化的元信息
+    :param arrays: dict, {名称: np.ndarray}
+    """
+    index = {}
+    offset = 0
+    items = []
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        offset = (offset + ALIGN - 1) // ALIGN * ALIGN
+        index[name] = [arr.dtype.str, list(arr.shape), offset]
+        items.append((offset, arr))
+        offset += arr.nbytes
+    header = json.dumps({'meta': meta, 'arrays': index}, ensure_ascii=False).encode('utf-8')
+    data_start = (len(MAGIC) + 8 + len(header) + ALIGN - 1) // ALIGN * ALIGN
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for offset, arr in items:
+            f.seek(data_start + offset)
+            f.write(arr.tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_meta(path):
+    """
+    只读取头部
+    :return: (meta, 数组索引, 数据起始位置)，文件格式不符时返回 None
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return None
+        size, = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(size).decode('utf-8'))
+    data_start = (len(MAGIC) + 8 + size + ALIGN - 1) // ALIGN * ALIGN
+    return header['meta'], header['arrays'], data_start
+
+
+def read_arrays(path):
+    """
+    以 mmap 方式打开 write_arrays 写出的文件，数组不会复制到内存
+    :return: (meta, dict {名称: 只读数组})，文件格式不符时返回 None
+    """
+    header = read_meta(path)
+    if header is None:
+        return None
+    meta, index, data_start = header
+    buf = np.memmap(path, dtype=np.uint8, mode='r')
+    arrays = {}
+    for name, (dtype, shape, offset) in index.items():
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape)) if shape else 1
+        start = data_start + offset
+        arrays[name] = buf[start:start + count * dtype.itemsize].view(dtype).reshape(shape)
+    return meta, arrays
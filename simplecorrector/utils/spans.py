@@ -0,0 +1,56 @@
+#!usr/bin/env python
+#-*- coding:utf-8 -*-
+
+from bisect import bisect_left, bisect_right
+
+
+class ErrorSpans(object):
+    """
+        疑似错误容器，元素为 [word, begin_idx, end_idx, err_type]，word 即原文 [begin_idx, end_idx) 的片段。
+        元素按起点有序保存（同起点按加入顺序），另维护一组互不包含的极大区间，
+        其起点与终点同时严格递增，包含判断只需一次二分查找。
+    """
+
+    def __init__(self, items=()):
+        self._items = []
+        self._begins = []
+        # 极大区间的起点与终点
+        self._max_begins = []
+        self._max_ends = []
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __getitem__(self, i):
+        return self._items[i]
+
+    def covers(self, begin_idx, end_idx):
+        """
+        :return: bool, 是否已有区间包含 [begin_idx, end_idx)
+        """
+        i = bisect_right(self._max_begins, begin_idx) - 1
+        return i >= 0 and self._max_ends[i] >= end_idx
+
+    def add(self, err):
+        """
+        加入疑似错误，已被某个已有区间包含（包括完全重复）时忽略
+        :param err: [word, begin_idx, end_idx, err_type]
+        :return: bool, 是否加入
+        """
+        begin_idx, end_idx = err[1], err[2]
+        if self.covers(begin_idx, end_idx):
+            return False
+        i = bisect_right(self._begins, begin_idx)
+        self._begins.insert(i, begin_idx)
+        self._items.insert(i, err)
+        # 新区间成为极大区间，移除被它包含的旧极大区间（在有序表中是连续的一段）
+        j = bisect_left(self._max_begins, begin_idx)
+        k = bisect_right(self._max_ends, end_idx, lo=j)
+        self._max_begins[j:k] = [begin_idx]
+        self._max_ends[j:k] = [end_idx]
+        return True
@@ -0,0 +1,118 @@
+#!usr/bin/env python
+#-*- coding:utf-8 -*-
+
+import functools
+import time
+
+from .logger import logger
+from .metrics import Histogram, exponential_bounds
+
+
+class CorrectorStats(object):
+    """
+        Corrector 各阶段耗时与调用次数、每次候选集大小与预筛剪掉的候选数、每个短句的语言模型调用次数。
+        多进程时每个进程各自统计。
+    """
+
+    def __init__(self, log_interval=None):
+        """
+        :param log_interval: 定期输出汇总日志的间隔（秒），None 表示不输出
+        """
+        self.log_interval = log_interval
+        self.stages = {}
+        self.candidates = Histogram(exponential_bounds(1, 2, 12))
+        self.pruned = Histogram(exponential_bounds(1, 2, 12))
+        self.lm_calls_per_block = Histogram(exponential_bounds(1, 2, 16))
+        self.lm_calls = 0
+        self.blocks = 0
+        self._last_log = time.time()
+
+    def record(self, stage, seconds):
+        hist = self.stages.get(stage)
+        if hist is None:
+            # 0.01ms - 约 5s
+            hist = self.stages[stage] = Histogram(exponential_bounds(0.01, 2, 20))
+        hist.observe(seconds * 1000)
+
+    def to_dict(self):
+        return {
+            'stages_ms': dict((stage, hist.to_dict()) for stage, hist in self.stages.items()),
+            'candidates': self.candidates.to_dict(),
+            'pruned_candidates': self.pruned.to_dict(),
+            'lm_calls_per_block': self.lm_calls_per_block.to_dict(),
+            'lm_calls': self.lm_calls,
+            'blocks': self.blocks,
+        }
+
+    def reset(self):
+        self.stages = {}
+        self.candidates.reset()
+        self.pruned.reset()
+        self.lm_calls_per_block.reset()
+        self.lm_calls = 0
+        self.blocks = 0
+
+    def summary(self):
+        parts = ['%s: %d calls %.3fms avg p99<=%sms' % (stage, hist.count, hist.total / hist.count, hist.quantile(0.99))
+                 for stage, hist in sorted(self.stages.items()) if hist.count]
+        parts.append('candidates avg %.1f' % (self.candidates.total / self.candidates.count
+                                              if self.candidates.count else 0))
+        if self.pruned.count:
+            parts.append('pruned %d of %d candidates' % (self.pruned.total, self.candidates.total))
+        parts.append('lm calls/block avg %.1f' % (self.lm_calls_per_block.total / self.lm_calls_per_block.count
+                                                  if self.lm_calls_per_block.count else 0))
+        return '; '.join(parts)
+
+    def maybe_log(self):
+        if self.log_interval is None:
+            return
+        now = time.time()
+        if now - self._last_log >= self.log_interval:
+            self._last_log = now
+            logger.info('corrector stats: %s' % self.summary())
+
+
+def timed(stage):
+    """
+    统计方法耗时，self.stats 为 None 时不计时
+    :param stage: 阶段名
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            stats = self.stats
+            if stats is None:
+                return func(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                stats.record(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class CountingModel(object):
+    """
+        语言模型代理，统计 score/perplexity/BaseScore/full_scores 调用次数，其余属性透传。
+        只包装被代理模型实际具有的方法，hasattr 判断不受影响。
+    """
+
+    COUNTED = ('score', 'perplexity', 'BaseScore', 'full_scores')
+
+    def __init__(self, lm, stats):
+        self.lm = lm
+        self.stats = stats
+
+    def __getattr__(self, name):
+        attr = getattr(self.lm, name)
+        if name not in self.COUNTED:
+            return attr
+        stats = self.stats
+
+        def counted(*args, **kwargs):
+            stats.lm_calls += 1
+            return attr(*args, **kwargs)
+        # 缓存到实例上，之后不再经过 __getattr__
+        setattr(self, name, counted)
+        return counted
@@ -0,0 +1,137 @@
+#!usr/bin/env python
+#-*- coding:utf-8 -*-
+
+import zlib
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+import numpy as np
+
+
+class StringTable(object):
+    """
+        按 UTF-8 字节序排好的只读字符串表：一段拼接的字节 + 偏移数组，可直接建立在 mmap 数组上。
+        编号即排序后的下标；查找走 crc32 开放寻址槽位表，槽位表与字符串一起存盘。
+    """
+
+    def __init__(self, blob, offsets, slots=None):
+        """
+        :param blob: np.uint8 数组，全部字符串的 UTF-8 拼接
+        :param offsets: np.int64 数组，长度为字符串数 + 1
+        :param slots: np.int32 槽位表，None 时现场构建
+        """
+        self.blob = blob
+        self.offsets = offsets
+        self._blob = memoryview(blob).cast('B') if len(blob) else memoryview(b'')
+        self._offsets = memoryview(offsets).cast('B').cast('q')
+        self._size = len(offsets) - 1
+        self.slots = slots if slots is not None else self._build_slots()
+        self._slots = memoryview(self.slots).cast('B').cast('i')
+        self._mask = len(self.slots) - 1
+
+    def _build_slots(self):
+        # 线性探测，槽位数为不小于 2 倍字符串数的 2 的幂，平均探测次数约 1.5
+        size = 1
+        while size < 2 * self._size:
+            size <<= 1
+        mask = size - 1
+        slots = [-1] * size
+        for i in range(self._size):
+            j = zlib.crc32(self._bytes(i)) & mask
+            while slots[j] >= 0:
+                j = (j + 1) & mask
+            slots[j] = i
+        return np.array(slots, dtype=np.int32)
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix=''):
+        """
+        :param arrays: to_arrays 写出的数组（可为 mmap）
+        :param prefix: 数组名前缀
+        """
+        return cls(arrays[prefix + 'blob'], arrays[prefix + 'offsets'], arrays.get(prefix + 'slots'))
+
+    def to_arrays(self, prefix=''):
+        return {prefix + 'blob': self.blob, prefix + 'offsets': self.offsets, prefix + 'slots': self.slots}
+
+    @classmethod
+    def build(cls, strings):
+        """
+        :param strings: 字符串集合，自动去重排序
+        :return: StringTable
+        """
+        encoded = sorted(set(s.encode('utf-8') for s in strings))
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        if encoded:
+            offsets[1:] = np.cumsum([len(s) for s in encoded])
+        blob = np.frombuffer(b''.join(encoded), dtype=np.uint8).copy()
+        return cls(blob, offsets)
+
+    def __len__(self):
+        return self._size
+
+    def _bytes(self, i):
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].tobytes()
+
+    def __getitem__(self, i):
+        if i < 0 or i >= self._size:
+            raise IndexError(i)
+        return self._bytes(i).decode('utf-8')
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self._bytes(i).decode('utf-8')
+
+    def __contains__(self, s):
+        return self.index(s) >= 0
+
+    def index(self, s):
+        """
+        :param s: str
+        :return: 编号，不存在时返回 -1
+        """
+        target = s.encode('utf-8')
+        slots = self._slots
+        mask = self._mask
+        j = zlib.crc32(target) & mask
+        while True:
+            i = slots[j]
+            if i < 0:
+                return -1
+            if self._bytes(i) == target:
+                return i
+            j = (j + 1) & mask
+
+
+class FrozenDict(Mapping):
+    """
+        StringTable 作键、numpy 数组作值的只读映射
+    """
+
+    def __init__(self, keys, values):
+        self.keys_table = keys
+        self.values = values
+
+    @classmethod
+    def build(cls, d, dtype=np.int64):
+        keys = StringTable.build(d)
+        values = np.array([d[k] for k in keys], dtype=dtype)
+        return cls(keys, values)
+
+    def __getitem__(self, key):
+        i = self.keys_table.index(key)
+        if i < 0:
+            raise KeyError(key)
+        return self.values[i].item()
+
+    def __contains__(self, key):
+        return self.keys_table.index(key) >= 0
+
+    def __iter__(self):
+        return iter(self.keys_table)
+
+    def __len__(self):
+        return len(self.keys_table)
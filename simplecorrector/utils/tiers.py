@@ -0,0 +1,107 @@
+#!usr/bin/env python
+#-*- coding:utf-8 -*-
+
+import json
+import os
+from bisect import bisect_right
+
+import numpy as np
+
+TIERS_VERSION = 1
+
+
+class TierThresholds(object):
+    """
+        分层检测的按长度阈值：短句整句的平均每字 log10 概率不低于对应长度的阈值时视为干净，
+        跳过字、词 n-gram 检测。同时记录走快速路径与完整路径的短句数。
+    """
+
+    def __init__(self, lengths, thresholds, quantile=None):
+        """
+        :param lengths: 升序的长度分段起点，如 [1, 4, 8]，小于首个起点的按首段处理
+        :param thresholds: 各分段的阈值
+        :param quantile: 拟合时使用的分位数，仅作记录
+        """
+        if len(lengths) != len(thresholds) or not lengths:
+            raise ValueError('lengths and thresholds must be non-empty and of the same size')
+        self.lengths = [int(x) for x in lengths]
+        self.thresholds = [float(x) for x in thresholds]
+        self.quantile = quantile
+        self.fast_blocks = 0
+        self.full_blocks = 0
+
+    def threshold(self, length):
+        return self.thresholds[max(0, bisect_right(self.lengths, length) - 1)]
+
+    def is_clean(self, length, score):
+        """
+        :param length: 短句计分的字数
+        :param score: 平均每字 log10 概率，None 表示无需计分（空白短句）
+        :return: bool, 是否走快速路径；同时计数
+        """
+        clean = score is None or score >= self.threshold(length)
+        if clean:
+            self.fast_blocks += 1
+        else:
+            self.full_blocks += 1
+        return clean
+
+    def counts(self):
+        total = self.fast_blocks + self.full_blocks
+        return {'fast_blocks': self.fast_blocks, 'full_blocks': self.full_blocks,
+                'fast_ratio': self.fast_blocks / float(total) if total else None}
+
+    def reset(self):
+        self.fast_blocks = 0
+        self.full_blocks = 0
+
+    @classmethod
+    def fit(cls, samples, quantile=0.1, min_samples=50):
+        """
+        由干净语料的短句得分拟合阈值：长度相邻的短句合并为至少 min_samples 条的分段，
+        每段取 quantile 分位数，即约 1 - quantile 的干净短句走快速路径
+        :param samples: list of (长度, 平均每字 log10 概率)
+        :param quantile: 分位数，越大越多短句进入完整检测
+        :param min_samples: 每个分段的最少样本数
+        :return: TierThresholds
+        """
+        by_length = {}
+        for length, score in samples:
+            if score is not None:
+                by_length.setdefault(length, []).append(score)
+        if not by_length:
+            raise ValueError('no samples to fit tier thresholds')
+        groups = []
+        current_lengths, current = [], []
+        for length in sorted(by_length):
+            current_lengths.append(length)
+            current.extend(by_length[length])
+            if len(current) >= min_samples:
+                groups.append((current_lengths[0], current))
+                current_lengths, current = [], []
+        if current:
+            # 末尾样本不足时并入上一段
+            if groups:
+                groups[-1] = (groups[-1][0], groups[-1][1] + current)
+            else:
+                groups.append((current_lengths[0], current))
+        return cls([start for start, _ in groups],
+                   [float(np.quantile(scores, quantile)) for _, scores in groups], quantile)
+
+    def to_dict(self):
+        return {'version': TIERS_VERSION, 'quantile': self.quantile,
+                'lengths': self.lengths, 'thresholds': self.thresholds}
+
+    def save(self, path):
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            d = json.load(f)
+        if d.get('version') != TIERS_VERSION:
+            raise ValueError('unsupported tier thresholds version %s: %s' % (d.get('version'), path))
+        return cls(d['lengths'], d['thresholds'], d.get('quantile'))
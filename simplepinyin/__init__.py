@@ -2,3 +2,10 @@ from . import lm
 from .lm import *
 
 __version__ = "0.1.1"
+
+
+def __getattr__(name):
+    # input_dict_nt_max 延迟加载，见 lm.__getattr__
+    if name == 'input_dict_nt_max':
+        return lm.input_dict_nt_max
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -0,0 +1,30 @@
+"""
+把 input_dict_nt_max.pickle 转为以 mmap 加载的二进制词表：
+
+    python -m simplepinyin.convert simplepinyin/input_dict_nt_max.pickle simplepinyin/input_dict_nt_max.bin
+
+二进制词表与 lm.py 放在同一目录时优先使用，不再需要 pickle。
+"""
+import pickle
+import sys
+
+from .trie import SyllableTrie
+
+
+def convert_pickle(pickle_path, path):
+    """
+    把 input_dict_nt_max.pickle 转为 SyllableTrie 二进制文件
+    :return: SyllableTrie
+    """
+    with open(pickle_path, 'rb') as handle:
+        trie = SyllableTrie.from_dict(pickle.load(handle))
+    trie.save(path)
+    return trie
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("usage: python -m simplepinyin.convert input_dict_nt_max.pickle input_dict_nt_max.bin")
+        sys.exit(1)
+    trie = convert_pickle(sys.argv[1], sys.argv[2])
+    print("%d words, %d syllables, %d bytes written to %s" % (len(trie), len(trie.syllables), trie.nbytes, sys.argv[2]))
@@ -1,16 +1,46 @@
 import os
 import re
+import math
 import sys
 import time
+import heapq
 import pickle
 import numpy as np
-from tqdm import trange
 from pypinyin import pinyin, lazy_pinyin, Style
 
 curdir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, curdir)
-with open(os.path.join(curdir, 'input_dict_nt_max.pickle'), 'rb') as handle:
-    input_dict_nt_max = pickle.load(handle)
+try:
+    from .trie import SyllableTrie
+except ImportError:
+    from trie import SyllableTrie
+
+# 词表在第一次转换或加词时才加载：优先以 mmap 打开二进制词表，没有时读取 pickle 再构建前缀树。
+# 二进制词表由 python -m simplepinyin.convert input_dict_nt_max.pickle input_dict_nt_max.bin 生成
+dict_path = os.path.join(curdir, 'input_dict_nt_max.bin')
+pickle_path = os.path.join(curdir, 'input_dict_nt_max.pickle')
+_trie = None
+
+def syllable_trie():
+    # input_dict_nt_max 的音节前缀树，各 Languagle_Model 共享
+    global _trie
+    if _trie is None:
+        if os.path.exists(dict_path):
+            _trie = SyllableTrie.load(dict_path)
+        else:
+            # 只保留前缀树，dict 用完即丢弃；需要 input_dict_nt_max 时再由前缀树还原
+            with open(pickle_path, 'rb') as handle:
+                _trie = SyllableTrie.from_dict(pickle.load(handle))
+    return _trie
+
+def __getattr__(name):
+    # 兼容直接访问 input_dict_nt_max 的代码：首次访问时由词表还原为 dict
+    if name == 'input_dict_nt_max':
+        trie = syllable_trie()
+        if 'input_dict_nt_max' not in globals():
+            globals()['input_dict_nt_max'] = dict(trie.items())
+        return globals()['input_dict_nt_max']
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 def remove_digits(x):
     return re.sub('[0-9]', '', x)
@@ -85,16 +115,31 @@ def pinyin_augment(_pinyin_list, hasTone):
 class Languagle_Model:
 
     def __init__(self):
-        self.longest = 0
-        self.pinyin_nt_set = set([])
-        self.longest = max([len(x) for x in input_dict_nt_max])
-        for key in input_dict_nt_max:
-            if len(key)==1: self.pinyin_nt_set.add(key[0])
+        # 词表在第一次用到时才加载，见 syllable_trie
+        self._pinyin_nt_set = None
+
+    @property
+    def trie(self):
+        return syllable_trie()
+
+    @property
+    def longest(self):
+        return self.trie.longest
+
+    @property
+    def pinyin_nt_set(self):
+        if self._pinyin_nt_set is None:
+            self._pinyin_nt_set = self.trie.single_syllables()
+        return self._pinyin_nt_set
 
     def add_words(self, words, vague_add=False):
+        trie = self.trie
+        _dict = globals().get('input_dict_nt_max')
         for word in words:
             _py_nt = tuple([remove_digits(x) for x in self.translate_c2p(word)])
-            input_dict_nt_max[_py_nt] = (word, 1)
+            if _dict is not None:
+                _dict[_py_nt] = (word, 1)
+            trie.add(_py_nt, word, 1)
 
     def translate_c2p(self, _str, hasTone=True):
         if hasTone:
@@ -102,42 +147,228 @@ class Languagle_Model:
         return lazy_pinyin(_str)
 
     def translate_p2c(self, _pinyin, max_length=10, stride=1):
+        # max_length 与 stride 是旧版滑动窗口的参数，动态规划解码不再需要，保留以兼容原有调用
+        _pinyin = remove_digits(" ".join(_pinyin)).split()
+        _input = [x for x in _pinyin if x in self.pinyin_nt_set]
+        return self.viterbi(_input)[0]
 
-        def helper(_pinyin, _dict):
-            if len(_pinyin) == 0:
-                return ["", 0]
-
-            rs = [(" ".join(_pinyin), 0)]
-            for l in range(1,min(self.longest,len(_pinyin))+1):
-                if l<len(_pinyin):
-                    if tuple(_pinyin[:l]) in _dict:
-                        r_prev = _dict[tuple(_pinyin[:l])]
-                        r_late = helper(_pinyin[l:], _dict)
-                        r = (r_prev[0]+r_late[0], r_prev[1]*r_late[1])
-                        rs.append(r)
-                elif l==len(_pinyin):
-                    if tuple(_pinyin) in _dict:
-                        r = _dict[tuple(_pinyin)]
-                        rs.append(r)
-            return sorted(rs, key=lambda kv: kv[1], reverse=True)[0]
+    def lattice(self, _input):
+        """
+        :param _input: 拼音音节列表，不带声调
+        :return: list, 第 i 项为从 i 开始的词 [(音节数, 词, 对数概率)]，按音节数升序
+        """
+        ids = self.trie.intern(_input)
+        return [self.trie.walk(_input, ids, i) for i in range(len(_input))]
 
+    def _backward(self, edges):
+        # best[i]: _input[i:] 的最优 (对数概率, 第一个词的音节数, 第一个词)，自后向前计算；
+        # 在对数空间累加，长句不会因连乘下溢为 0
+        n = len(edges)
+        best = [None] * n + [(0.0, 0, "")]
+        for i in range(n - 1, -1, -1):
+            top = (-math.inf, 0, "")
+            for l, word, logp in edges[i]:
+                score = logp + best[i + l][0]
+                # 同分时取较短的第一个词，与穷举时按长度顺序、稳定排序的结果一致
+                if score > top[0]:
+                    top = (score, l, word)
+            best[i] = top
+        return best
+
+    def viterbi(self, _input):
+        """
+        在词表构成的切分网格上做动态规划，求概率乘积最大的切分，
+        耗时与 len(_input) * self.longest 成正比，结果与穷举全部切分相同。
+        :param _input: 拼音音节列表，不带声调
+        :return: (文本, 概率)，没有可行切分时返回原拼音与 0
+        """
+        n = len(_input)
+        if n == 0:
+            return "", 0
+        best = self._backward(self.lattice(_input))
+        if best[0][0] == -math.inf:
+            return " ".join(_input), 0
+        words = []
+        i = 0
+        while i < n:
+            _, l, word = best[i]
+            words.append(word)
+            i += l
+        return "".join(words), math.exp(best[0][0])
+
+    def translate_p2c_nbest(self, _pinyin, k=5, beam_width=200, time_budget=None):
+        """
+        返回概率最高的 k 个转换结果
+        :param _pinyin: 拼音音节列表
+        :param k: 结果个数，1 时即 translate_p2c 的结果
+        :param beam_width: 待扩展的部分路径最多保留的条数
+        :param time_budget: 耗时上限（秒），超时后返回已得到的结果，至少包含最优结果
+        :return: list of (文本, 概率)，概率降序，文本不重复
+        """
         _pinyin = remove_digits(" ".join(_pinyin)).split()
         _input = [x for x in _pinyin if x in self.pinyin_nt_set]
+        if k <= 1:
+            return [self.viterbi(_input)]
+        return self.nbest(_input, k, beam_width, time_budget)
+
+    def nbest(self, _input, k=5, beam_width=200, time_budget=None):
+        """
+        自左向右的束搜索，部分路径按 已得分 + 后缀的 Viterbi 最优分 排序。
+        后缀最优分是精确的上界，完整路径按概率从高到低依次出队；束宽只在候选过多时截断。
+        :return: list of (文本, 概率)
+        """
+        n = len(_input)
+        if n == 0:
+            return [("", 0)]
+        edges = self.lattice(_input)
+        best = self._backward(edges)
+        if best[0][0] == -math.inf:
+            return [(" ".join(_input), 0)]
+        deadline = None if time_budget is None else time.perf_counter() + time_budget
+        results = []
+        seen = set()
+        # (-上界, 序号, 位置, 已得分, 已选的词)，序号保证同分时先入队者先出；
+        # 已选的词存为 (词, 前缀) 链表，扩展时不复制
+        heap = [(-best[0][0], 0, 0, 0.0, None)]
+        counter = 1
+        while heap and len(results) < k:
+            _, _, i, score, words = heapq.heappop(heap)
+            if i == n:
+                path = []
+                while words is not None:
+                    path.append(words[0])
+                    words = words[1]
+                text = "".join(reversed(path))
+                if text not in seen:
+                    seen.add(text)
+                    results.append((text, math.exp(score)))
+                continue
+            if deadline is not None and results and time.perf_counter() > deadline:
+                break
+            for l, word, logp in edges[i]:
+                suffix = best[i + l][0]
+                if suffix == -math.inf:
+                    continue
+                heapq.heappush(heap, (-(score + logp + suffix), counter, i + l, score + logp, (word, words)))
+                counter += 1
+            # 超过束宽两倍时才截断，摊薄排序开销
+            if len(heap) > 2 * beam_width:
+                heap = heapq.nsmallest(beam_width, heap)
+        return results
 
-        if len(_input)<(max_length+1):
-            return helper(_input, input_dict_nt_max)[0]
-        fixed = []
-        last = "",-1,stride
-        for start in range(0, len(_input)-max_length+stride, stride):
-            text, prob = helper(_input[start:start+max_length], input_dict_nt_max)
-            if prob>last[1] or start>=(len(fixed)+(len(last[0])-last[2])//stride*stride):
-                fixed.append(text[:stride])
-                last = text,prob,stride
+    def session(self, _pinyin=()):
+        """
+        :return: DecodingSession, 逐音节输入时增量解码
+        """
+        return DecodingSession(self, _pinyin)
+
+
+class DecodingSession:
+    """
+    输入法逐键解码：保存前向动态规划的得分与回溯指针，以及仍在前缀树中延伸的各起点的节点，
+    追加音节时每个起点只走一步，删除音节直接截断，耗时与 model.longest 成正比，与句子长度无关。
+    最优路径的概率与 translate_p2c 相同；词表被 add_words 修改后需调用 rebuild。
+    """
+
+    def __init__(self, model, _pinyin=()):
+        """
+        :param model: Languagle_Model
+        :param _pinyin: 初始音节
+        """
+        self.model = model
+        self.syllables = []
+        # scores[j]: 前 j 个音节的最优对数概率；back[j]: 该路径最后一个词的 (音节数, 词)；
+        # active[j]: 在第 j 个音节处仍可延伸的 (起点, 前缀树节点, 叠加层节点)，按起点从后到前
+        self.scores = [0.0]
+        self.back = [None]
+        self.active = [[]]
+        self._text = None
+        self.extend(_pinyin)
+
+    def __len__(self):
+        return len(self.syllables)
+
+    def append(self, syllable):
+        """
+        :param syllable: 一个拼音音节，可带声调
+        :return: bool, 不在音节表中的输入被忽略，返回 False
+        """
+        syllable = remove_digits(syllable).strip()
+        if syllable not in self.model.pinyin_nt_set:
+            return False
+        trie = self.model.trie
+        sid = trie.intern([syllable])[0]
+        j = len(self.syllables)
+        self.syllables.append(syllable)
+        top, pointer = -math.inf, None
+        active = []
+        # 新起点的音节数为 1，其余按音节数升序，同分时取较短的最后一个词
+        for start, node, overlay in [(j, trie.ROOT, trie.overlay)] + self.active[j]:
+            node = trie.child(node, sid)
+            overlay = overlay.get(syllable) if overlay is not None else None
+            if node < 0 and overlay is None:
+                continue
+            active.append((start, node, overlay))
+            item = overlay[None] if overlay is not None and None in overlay else trie.word(node)
+            prev = self.scores[start]
+            if item is None or prev == -math.inf or item[1] == -math.inf:
+                continue
+            score = prev + item[1]
+            if score > top:
+                top, pointer = score, (j + 1 - start, item[0])
+        self.scores.append(top)
+        self.back.append(pointer)
+        self.active.append(active)
+        self._text = None
+        return True
+
+    def extend(self, _pinyin):
+        for syllable in _pinyin:
+            self.append(syllable)
+
+    def pop(self, count=1):
+        """删除末尾 count 个音节，之前的状态不受影响，直接截断"""
+        count = min(count, len(self.syllables))
+        if count <= 0:
+            return
+        del self.syllables[-count:]
+        del self.scores[-count:]
+        del self.back[-count:]
+        del self.active[-count:]
+        self._text = None
+
+    def clear(self):
+        self.pop(len(self.syllables))
+
+    def rebuild(self):
+        """词表变化后按当前音节重新计算"""
+        syllables = self.syllables
+        self.syllables, self.scores, self.back, self.active = [], [0.0], [None], [[]]
+        self._text = None
+        self.extend(syllables)
+
+    def result(self):
+        """
+        :return: (文本, 概率)，没有可行切分时返回原拼音与 0
+        """
+        if self._text is None:
+            j = len(self.syllables)
+            if j == 0:
+                self._text = ("", 0)
+            elif self.scores[j] == -math.inf:
+                self._text = (" ".join(self.syllables), 0)
             else:
-                fixed.append(last[0][last[2]:last[2]+stride])
-                last = last[0],last[1],last[2]+stride
-        fixed.append(text[stride:])
-        return "".join(fixed)
+                words = []
+                while j > 0:
+                    l, word = self.back[j]
+                    words.append(word)
+                    j -= l
+                self._text = ("".join(reversed(words)), math.exp(self.scores[-1]))
+        return self._text
+
+    @property
+    def text(self):
+        return self.result()[0]
 
 if __name__=="__main__":
     lm = Languagle_Model()
@@ -0,0 +1,320 @@
+import json
+import math
+import os
+import struct
+from bisect import bisect_left
+
+import numpy as np
+
+MAGIC = b'SPTRIE01'
+TRIE_VERSION = 1
+ALIGN = 64
+
+
+class SyllableTrie:
+    """
+    以音节 ID 为边的前缀树，节点按层序存放在紧凑数组中，同一节点的子节点连续且按音节 ID 升序：
+        offsets[node]:offsets[node+1]  子节点范围，labels[子节点] 为边上的音节 ID
+        word_ids[node]                  以该节点结尾的词在 words 中的序号，-1 表示没有
+    词以 UTF-8 拼接存放，概率存为自然对数。从某个位置出发沿树走一遍即可得到从该位置开始的全部词。
+    运行时加入的词放在嵌套 dict 构成的叠加层中，同一拼音以叠加层为准。
+    """
+
+    ROOT = 0
+
+    def __init__(self, syllables, offsets, labels, word_ids, word_blob, word_offsets, logps):
+        self.syllables = list(syllables)
+        self.syllable_ids = dict((s, i) for i, s in enumerate(self.syllables))
+        self.offsets = offsets
+        self.labels = labels
+        self.word_ids = word_ids
+        self.word_blob = word_blob
+        self.word_offsets = word_offsets
+        self.logps = logps
+        # bisect 直接作用于 memoryview，免去逐次构造 numpy 标量
+        self._offsets = memoryview(np.ascontiguousarray(offsets, dtype=np.int32))
+        self._labels = memoryview(np.ascontiguousarray(labels, dtype=np.int32))
+        self._word_ids = memoryview(np.ascontiguousarray(word_ids, dtype=np.int32))
+        self._word_blob = memoryview(np.ascontiguousarray(word_blob, dtype=np.uint8))
+        self._word_offsets = memoryview(np.ascontiguousarray(word_offsets, dtype=np.int32))
+        self._logps = memoryview(np.ascontiguousarray(logps, dtype=np.float64))
+        self.longest = self._depth()
+        # 根的子节点按音节 ID 直接索引
+        self._root = [-1] * len(self.syllables)
+        for node in range(self._offsets[self.ROOT], self._offsets[self.ROOT + 1]):
+            self._root[self._labels[node]] = node
+        # 叠加层：{音节: 子节点}，键 None 存放 (词, 对数概率)
+        self.overlay = {}
+        self.overlay_longest = 0
+
+    def _depth(self):
+        # 层序存放，最后一个节点所在的层即最大深度
+        depth = 0
+        node = len(self._word_ids) - 1
+        while node > self.ROOT:
+            node = int(np.searchsorted(self.offsets, node, side='right')) - 1
+            depth += 1
+        return depth
+
+    @classmethod
+    def from_dict(cls, _dict):
+        """
+        :param _dict: 拼音元组 -> (词, 概率)
+        :return: SyllableTrie
+        """
+        syllables = sorted(set(s for key in _dict for s in key))
+        ids = dict((s, i) for i, s in enumerate(syllables))
+        keys = {}
+        for key, (word, prob) in _dict.items():
+            if key:
+                keys[tuple(ids[s] for s in key)] = (word, prob)
+        # 每层的节点即该长度的全部前缀，字典序排列后父节点相同的子节点自然连续
+        levels = [[()]]
+        depth = 1
+        while True:
+            level = sorted(set(key[:depth] for key in keys if len(key) >= depth))
+            if not level:
+                break
+            levels.append(level)
+            depth += 1
+        nodes = [prefix for level in levels for prefix in level]
+        index = dict((prefix, i) for i, prefix in enumerate(nodes))
+        counts = np.zeros(len(nodes) + 1, dtype=np.int32)
+        labels = np.full(len(nodes), -1, dtype=np.int32)
+        word_ids = np.full(len(nodes), -1, dtype=np.int32)
+        for i, prefix in enumerate(nodes):
+            if prefix:
+                counts[index[prefix[:-1]] + 1] += 1
+                labels[i] = prefix[-1]
+        # 根的子节点从 1 开始
+        offsets = (np.cumsum(counts) + 1).astype(np.int32)
+        blob = []
+        word_offsets = [0]
+        logps = []
+        for i, prefix in enumerate(nodes):
+            item = keys.get(prefix)
+            if item is None:
+                continue
+            word, prob = item
+            word_ids[i] = len(logps)
+            data = word.encode('utf-8')
+            blob.append(data)
+            word_offsets.append(word_offsets[-1] + len(data))
+            logps.append(math.log(prob) if prob > 0 else -math.inf)
+        return cls(syllables, offsets, labels, word_ids,
+                   np.frombuffer(b''.join(blob), dtype=np.uint8),
+                   np.asarray(word_offsets, dtype=np.int32), np.asarray(logps, dtype=np.float64))
+
+    def to_arrays(self):
+        """
+        :return: dict of np.ndarray，音节表以 UTF-8 拼接后另存
+        """
+        data = [s.encode('utf-8') for s in self.syllables]
+        syllable_offsets = np.zeros(len(data) + 1, dtype=np.int32)
+        syllable_offsets[1:] = np.cumsum([len(d) for d in data])
+        return {'syllable_blob': np.frombuffer(b''.join(data), dtype=np.uint8),
+                'syllable_offsets': syllable_offsets,
+                'offsets': np.asarray(self.offsets, dtype=np.int32),
+                'labels': np.asarray(self.labels, dtype=np.int32),
+                'word_ids': np.asarray(self.word_ids, dtype=np.int32),
+                'word_blob': np.asarray(self.word_blob, dtype=np.uint8),
+                'word_offsets': np.asarray(self.word_offsets, dtype=np.int32),
+                'logps': np.asarray(self.logps, dtype=np.float64)}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        blob = bytes(arrays['syllable_blob'])
+        bounds = arrays['syllable_offsets']
+        syllables = [blob[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(len(bounds) - 1)]
+        return cls(syllables, arrays['offsets'], arrays['labels'], arrays['word_ids'],
+                   arrays['word_blob'], arrays['word_offsets'], arrays['logps'])
+
+    def save(self, path):
+        """
+        写成单个二进制文件：魔数 + 头部长度 + JSON 头部 + 按 64 字节对齐的数组，叠加层不写入
+        """
+        index = {}
+        offset = 0
+        items = []
+        for name, arr in self.to_arrays().items():
+            arr = np.ascontiguousarray(arr)
+            offset = (offset + ALIGN - 1) // ALIGN * ALIGN
+            index[name] = [arr.dtype.str, list(arr.shape), offset]
+            items.append((offset, arr))
+            offset += arr.nbytes
+        header = json.dumps({'version': TRIE_VERSION, 'arrays': index}).encode('utf-8')
+        data_start = (len(MAGIC) + 8 + len(header) + ALIGN - 1) // ALIGN * ALIGN
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<Q', len(header)))
+            f.write(header)
+            for offset, arr in items:
+                f.seek(data_start + offset)
+                f.write(arr.tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        以 mmap 方式打开 save 写出的文件，数组不复制到内存，fork 出的子进程共享同一份页面
+        """
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError('not a syllable trie file: %s' % path)
+            size, = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(size).decode('utf-8'))
+        if header.get('version') != TRIE_VERSION:
+            raise ValueError('unsupported syllable trie version %s: %s' % (header.get('version'), path))
+        data_start = (len(MAGIC) + 8 + size + ALIGN - 1) // ALIGN * ALIGN
+        buf = np.memmap(path, dtype=np.uint8, mode='r')
+        arrays = {}
+        for name, (dtype, shape, offset) in header['arrays'].items():
+            dtype = np.dtype(dtype)
+            count = int(np.prod(shape)) if shape else 1
+            start = data_start + offset
+            arrays[name] = buf[start:start + count * dtype.itemsize].view(dtype).reshape(shape)
+        return cls.from_arrays(arrays)
+
+    def items(self):
+        """
+        :return: 逐个给出 (拼音元组, (词, 概率))，叠加层优先，与 input_dict_nt_max 的格式相同；概率由对数还原
+        """
+        overlay = {}
+        stack = [((), self.overlay)]
+        while stack:
+            prefix, node = stack.pop()
+            for s, child in node.items():
+                if s is None:
+                    overlay[prefix] = child
+                else:
+                    stack.append((prefix + (s,), child))
+        # 层序存放，逐层记下每个节点的音节元组
+        parents = np.searchsorted(self.offsets, np.arange(len(self._word_ids)), side='right') - 1
+        keys = [()]
+        for node in range(1, len(self._word_ids)):
+            keys.append(keys[parents[node]] + (self.syllables[self._labels[node]],))
+            item = overlay.pop(keys[node], None) or self.word(node)
+            if item is not None:
+                yield keys[node], (item[0], math.exp(item[1]))
+        for key, (word, logp) in overlay.items():
+            yield key, (word, math.exp(logp))
+
+    @property
+    def nbytes(self):
+        return sum(int(a.nbytes) for a in self.to_arrays().values())
+
+    def __len__(self):
+        return len(self.logps)
+
+    def intern(self, syllables):
+        """
+        :return: list of int, 不在音节表中的为 -1
+        """
+        get = self.syllable_ids.get
+        return [get(s, -1) for s in syllables]
+
+    def child(self, node, sid):
+        """
+        :return: int, 子节点，不存在时为 -1
+        """
+        if node < 0 or sid < 0:
+            return -1
+        if node == self.ROOT:
+            return self._root[sid]
+        lo, hi = self._offsets[node], self._offsets[node + 1]
+        i = bisect_left(self._labels, sid, lo, hi)
+        if i < hi and self._labels[i] == sid:
+            return i
+        return -1
+
+    def word(self, node):
+        """
+        :return: (词, 对数概率)，节点上没有词时为 None
+        """
+        if node < 0:
+            return None
+        wid = self._word_ids[node]
+        if wid < 0:
+            return None
+        return bytes(self._word_blob[self._word_offsets[wid]:self._word_offsets[wid + 1]]).decode('utf-8'), \
+            self._logps[wid]
+
+    def find(self, syllables):
+        """
+        :param syllables: 拼音元组
+        :return: (词, 对数概率) 或 None，叠加层优先
+        """
+        node = self.overlay
+        for s in syllables:
+            node = node.get(s)
+            if node is None:
+                break
+        else:
+            if None in node:
+                return node[None]
+        node = self.ROOT
+        for sid in self.intern(syllables):
+            node = self.child(node, sid)
+        return self.word(node)
+
+    def add(self, syllables, word, prob):
+        """加入叠加层，覆盖同一拼音的原有词"""
+        node = self.overlay
+        for s in syllables:
+            node = node.setdefault(s, {})
+        node[None] = (word, math.log(prob) if prob > 0 else -math.inf)
+        self.overlay_longest = max(self.overlay_longest, len(syllables))
+
+    def walk(self, syllables, ids, start, limit=None):
+        """
+        从 start 出发沿树走一遍
+        :param syllables: 音节列表
+        :param ids: intern(syllables) 的结果
+        :param limit: 最多走的音节数
+        :return: list of (音节数, 词, 对数概率)，按音节数升序，只含概率大于 0 的词
+        """
+        end = len(ids) if limit is None else min(len(ids), start + limit)
+        offsets, labels, word_ids = self._offsets, self._labels, self._word_ids
+        blob, word_offsets, logps = self._word_blob, self._word_offsets, self._logps
+        result = []
+        node = self._root[ids[start]] if start < end and ids[start] >= 0 else -1
+        j = start
+        while node >= 0:
+            wid = word_ids[node]
+            if wid >= 0:
+                logp = logps[wid]
+                if logp > -math.inf:
+                    result.append((j - start + 1, bytes(blob[word_offsets[wid]:word_offsets[wid + 1]]).decode('utf-8'),
+                                   logp))
+            j += 1
+            if j >= end or ids[j] < 0:
+                break
+            sid = ids[j]
+            hi = offsets[node + 1]
+            node = bisect_left(labels, sid, offsets[node], hi)
+            if node >= hi or labels[node] != sid:
+                break
+        if not self.overlay_longest:
+            return result
+        found = dict((l, (word, logp)) for l, word, logp in result)
+        node = self.overlay
+        for j in range(start, min(end, start + self.overlay_longest)):
+            node = node.get(syllables[j])
+            if node is None:
+                break
+            if None in node:
+                found[j - start + 1] = node[None]
+        return [(l, word, logp) for l, (word, logp) in sorted(found.items()) if logp > -math.inf]
+
+    def single_syllables(self):
+        """
+        :return: set, 本身构成词的音节
+        """
+        result = set(s for s, child in self.overlay.items() if None in child)
+        offsets = self._offsets
+        for node in range(offsets[self.ROOT], offsets[self.ROOT + 1]):
+            if self._word_ids[node] >= 0:
+                result.add(self.syllables[self._labels[node]])
+        return result
+